@@ -1,7 +1,7 @@
 import requests
 import json
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 
 class LLMModule:
     def __init__(self, model_name: str = "llama3:8b", base_url: str = "http://localhost:11434", fast_mode: bool = True):
@@ -19,8 +19,13 @@ class LLMModule:
         self.chat_url = f"{base_url}/api/chat"
         self.fast_mode = fast_mode
         
+        # One pooled keep-alive connection to Ollama, reused by every request
+        self._session = requests.Session()
+        self._session.headers.update({"Connection": "keep-alive"})
+        
         # Test connection
         self._test_connection()
+        self._warmup()
         
         # Conversation context
         self.conversation_history = []
@@ -29,7 +34,7 @@ class LLMModule:
     def _test_connection(self):
         """Test connection to Ollama"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            response = self._session.get(f"{self.base_url}/api/tags")
             if response.status_code == 200:
                 print(f"✅ Connected to Ollama successfully!")
                 print(f"📦 Using model: {self.model_name}")
@@ -40,6 +45,19 @@ class LLMModule:
             print("Make sure Ollama is running: ollama serve")
             raise
     
+    def _warmup(self):
+        """Load the model into Ollama and open the pooled connection with a 1-token generate"""
+        try:
+            payload = {
+                "model": self.model_name,
+                "prompt": "Hi",
+                "stream": False,
+                "options": {"num_predict": 1}
+            }
+            self._session.post(self.api_url, json=payload, timeout=60.0)
+        except Exception as e:
+            print(f"⚠️  LLM warmup failed: {e}")
+    
     def _add_to_history(self, role: str, content: str):
         """Add message to conversation history"""
         self.conversation_history.append({"role": role, "content": content})
@@ -64,75 +82,82 @@ class LLMModule:
                 return text[: idx + len(end.strip())].strip()
         return text.strip()
     
-    def generate_response(self, user_input: str, memory_context: str = "") -> str:
+    def _build_generation_payload(self, user_input: str, memory_context: str = "", format: Optional[str] = None, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """Build the Ollama request body for a response with memory context"""
+        # Optimized prompt for speed - only include essential memory context
+        if self.fast_mode and memory_context and len(memory_context) > 100:
+            # Fast mode: minimal context for speed
+            prompt = f"""Max (be concise): {user_input}"""
+        elif memory_context and len(memory_context) > 100:
+            # Normal mode: include some context
+            recent_context = memory_context[-500:]  # Limit to last 500 chars
+            prompt = f"""Max AI Assistant (be concise). Recent context: {recent_context}
+
+User: {user_input}
+Max:"""
+        else:
+            # Fast response for simple queries
+            prompt = f"""Max AI Assistant (be concise). User: {user_input}
+Max:"""
+        
+        # Optimize parameters based on mode - keep responses concise
+        if self.fast_mode:
+            options = {
+                "temperature": 0.7,
+                "top_p": 0.8,
+                "enable_thinking": False,
+                "num_ctx": 1024,  # Very small context for speed
+                "num_predict": 50,  # Very short responses
+                "repeat_penalty": 1.1,
+                "num_gpu": -1  # Offload as many layers to the GPU as fit
+            }
+        else:
+            options = {
+                "temperature": 0.7,
+                "top_p": 0.8,
+                "enable_thinking": False,
+                "num_ctx": 2048,
+                "num_predict": 75,  # Shorter responses
+                "repeat_penalty": 1.1,
+                "num_gpu": -1  # Offload as many layers to the GPU as fit
+            }
+        
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": True,
+            "options": options
+        }
+        if format:
+            # Ollama constrains decoding to this output format (e.g. "json")
+            payload["format"] = format
+        if system_prompt:
+            # Sent as Ollama's system message; an identical prefix lets the model reuse its KV cache
+            payload["system"] = system_prompt
+        return payload
+    
+    def generate_response_stream(self, user_input: str, memory_context: str = "", format: Optional[str] = None, system_prompt: Optional[str] = None) -> Iterator[str]:
         """
-        Generate a response using the LLM with memory context
+        Generate a response using the LLM, yielding text as tokens arrive
         
         Args:
             user_input: User's input
             memory_context: Session memory context to include in prompt
+            format: Ollama output format constraint, e.g. "json"
+            system_prompt: Static instructions sent separately from the per-request prompt
         """
         try:
-            # Temporarily disable history to prevent hallucination
-            # self._add_to_history("user", user_input)
-            
-            # Use Qwen3 chat template format
-            messages = [
-                {"role": "user", "content": user_input}
-            ]
-            
-            # Optimized prompt for speed - only include essential memory context
-            if self.fast_mode and memory_context and len(memory_context) > 100:
-                # Fast mode: minimal context for speed
-                recent_context = memory_context[-200:]  # Very limited context
-                prompt = f"""Max (be concise): {user_input}"""
-            elif memory_context and len(memory_context) > 100:
-                # Normal mode: include some context
-                recent_context = memory_context[-500:]  # Limit to last 500 chars
-                prompt = f"""Max AI Assistant (be concise). Recent context: {recent_context}
-
-User: {user_input}
-Max:"""
-            else:
-                # Fast response for simple queries
-                prompt = f"""Max AI Assistant (be concise). User: {user_input}
-Max:"""
-            
-            # Optimize parameters based on mode - keep responses concise
-            if self.fast_mode:
-                options = {
-                    "temperature": 0.7,
-                    "top_p": 0.8,
-                    "enable_thinking": False,
-                    "num_ctx": 1024,  # Very small context for speed
-                    "num_predict": 50,  # Very short responses
-                    "repeat_penalty": 1.1
-                }
-            else:
-                options = {
-                    "temperature": 0.7,
-                    "top_p": 0.8,
-                    "enable_thinking": False,
-                    "num_ctx": 2048,
-                    "num_predict": 75,  # Shorter responses
-                    "repeat_penalty": 1.1
-                }
-            
-            payload = {
-                "model": self.model_name,
-                "prompt": prompt,
-                "stream": True,
-                "options": options
-            }
+            payload = self._build_generation_payload(user_input, memory_context, format, system_prompt)
             
             # Stream the response
             start = time.time()
             first_token_time = None
             token_count = 0
-            response = requests.post(self.api_url, json=payload, timeout=60.0, stream=True)
+            with self._session.post(self.api_url, json=payload, timeout=60.0, stream=True) as response:
+            
+                if response.status_code != 200:
+                    return
             
-            if response.status_code == 200:
-                aggregated = []
                 inside_thinking = False  # Track if we're inside a thinking block
                 for line in response.iter_lines(decode_unicode=True):
                     if not line:
@@ -141,16 +166,16 @@ Max:"""
                         chunk = json.loads(line)
                     except json.JSONDecodeError:
                         continue
-                    
+                
                     if chunk.get("done"):
                         break
-                    
+                
                     token = chunk.get("response", "")
                     if token:
                         # Track first token time
                         if first_token_time is None:
                             first_token_time = time.time()
-                        
+                    
                         # Properly filter out thinking tokens between <think> and </think> tags
                         if "<think>" in token:
                             # Start of thinking block - skip this token and all subsequent tokens
@@ -164,34 +189,71 @@ Max:"""
                             # Inside thinking block - skip all tokens
                             continue
                         else:
-                            # Outside thinking block - add token to response
-                            aggregated.append(token)
+                            # Outside thinking block - hand the token to the caller
                             token_count += 1
+                            yield token
+            
+            if token_count:
+                # Calculate stats
+                total_time = time.time() - start
+                time_to_first_token = first_token_time - start if first_token_time else 0
+                tokens_per_sec = token_count / total_time if total_time > 0 else 0
                 
-                llm_response = "".join(aggregated).strip()
-                if llm_response:
-                    # Calculate stats
-                    total_time = time.time() - start
-                    time_to_first_token = first_token_time - start if first_token_time else 0
-                    tokens_per_sec = token_count / total_time if total_time > 0 else 0
-                    
-                    # Print stats
-                    print(f"📊 Stats: Model={self.model_name}, Tokens={token_count}, Time={total_time:.2f}s, FirstToken={time_to_first_token:.2f}s, Speed={tokens_per_sec:.1f} tokens/sec")
-                    
-                    # Temporarily disable history to prevent hallucination
-                    # self._add_to_history("assistant", llm_response)
-                    
-                    # Clear history after each response to prevent context contamination
-                    # if len(self.conversation_history) > 4:  # Keep only last 2 exchanges
-                    #     self.conversation_history = self.conversation_history[-4:]
-                    
-                    return llm_response
+                # Print stats
+                print(f"📊 Stats: Model={self.model_name}, Tokens={token_count}, Time={total_time:.2f}s, FirstToken={time_to_first_token:.2f}s, Speed={tokens_per_sec:.1f} tokens/sec")
+            
+        except Exception as e:
+            print(f"❌ Error generating response: {e}")
+    
+    def generate_response(self, user_input: str, memory_context: str = "", format: Optional[str] = None, system_prompt: Optional[str] = None) -> str:
+        """
+        Generate a response using the LLM with memory context
+        
+        Args:
+            user_input: User's input
+            memory_context: Session memory context to include in prompt
+            format: Ollama output format constraint, e.g. "json"
+            system_prompt: Static instructions sent separately from the per-request prompt
+        """
+        # Temporarily disable history to prevent hallucination
+        # self._add_to_history("user", user_input)
+        return "".join(self.generate_response_stream(user_input, memory_context, format, system_prompt)).strip()
+    
+    def generate_json(self, instruction: str, system_prompt: str, max_tokens: int = 128) -> str:
+        """
+        Generate a JSON-constrained reply to a raw instruction
+        
+        Unlike generate_response, the instruction is sent as-is (no conversational
+        wrapper) and the token budget is sized for a structured answer.
+        
+        Args:
+            instruction: The request to answer, sent verbatim as the prompt
+            system_prompt: Static instructions describing the expected JSON
+            max_tokens: Upper bound on generated tokens
+        """
+        try:
+            payload = {
+                "model": self.model_name,
+                "prompt": instruction,
+                "system": system_prompt,
+                "format": "json",
+                "stream": False,
+                "options": {
+                    "temperature": 0.1,
+                    "num_predict": max_tokens,
+                    "enable_thinking": False
+                }
+            }
             
-            # Return empty if no response
+            start_time = time.time()
+            response = self._session.post(self.api_url, json=payload, timeout=10.0)
+            if response.status_code == 200:
+                print(f"🧩 LLM JSON: {time.time() - start_time:.2f}s")
+                return response.json().get("response", "").strip()
             return ""
             
         except Exception as e:
-            print(f"❌ Error generating response: {e}")
+            print(f"❌ Error generating JSON: {e}")
             return ""
     
     def get_intent(self, user_input: str) -> Dict[str, Any]:
@@ -325,7 +387,7 @@ Return only the intent word:"""
             }
             
             start_time = time.time()
-            response = requests.post(self.api_url, json=payload, timeout=3.0)
+            response = self._session.post(self.api_url, json=payload, timeout=3.0)
             if response.status_code == 200:
                 intent_time = time.time() - start_time
                 intent = response.json().get("response", "unknown").strip().lower()
@@ -6,7 +6,12 @@ A voice-enabled AI assistant with memory, tools, and interruption capabilities
 
 import time
 import sys
-import os
+import re
+import queue
+import signal
+import threading
+import logging
+import logging.handlers
 from stt_module import STTModule
 from llm_module import LLMModule
 from tts_module import TTSModule
@@ -14,43 +19,88 @@ from tools_module import ToolsModule
 from simple_interrupt import SimpleInterrupt
 from memory_module import MaxMemory
 
+logger = logging.getLogger(__name__)
+
+# Voice commands, compiled once into one pattern so each utterance is a single regex scan
+_CMD_RE = re.compile(
+    r'\b(?:(?P<sleep>go to sleep|goodbye|bye|exit|quit)|(?P<stop>stop|interrupt|shut up|quiet))\b',
+    re.I
+)
+
+# Phrase -> command table for the Aho-Corasick matcher
+VOICE_COMMANDS = [
+    ("go to sleep", "sleep"), ("goodbye", "sleep"), ("bye", "sleep"),
+    ("exit", "sleep"), ("quit", "sleep"),
+    ("stop", "stop"), ("interrupt", "stop"), ("shut up", "stop"), ("quiet", "stop"),
+]
+
 class MaxAIAssistant:
     """Main Max AI Assistant class that integrates all modules"""
     
-    def __init__(self):
-        """Initialize Max AI Assistant with all capabilities"""
-        self.stt = None
-        self.llm = None
-        self.tts = None
-        self.tools = None
+    def __init__(self, stt=None, llm=None, tts=None, tools=None):
+        """
+        Initialize Max AI Assistant with all capabilities
+        
+        Args:
+            stt, llm, tts, tools: Optional already-loaded (warm) modules to reuse;
+                any left as None are created by initialize_modules
+        """
+        self.stt = stt
+        self.llm = llm
+        self.tts = tts
+        self.tools = tools
         self.simple_interrupt = None
         self.memory = None
         self.is_running = False
         self.current_response = None
+        self._pending_turn = None  # (user_input, chunks, done) of the turn still being spoken
+        self._turn_lock = threading.Lock()
+        self._tools_schema = []
+        self._tools_prompt = None
+        self._command_automaton = None
         
     def initialize_modules(self):
         """Initialize all modules"""
         print("🤖 Initializing Max AI Assistant...")
         print("=" * 50)
         
-        print("🎤 Initializing Speech Recognition...")
-        self.stt = STTModule(model_name="base")
+        # Model-backed modules are expensive to load, so reuse any that were passed in
+        if self.stt is None:
+            print("🎤 Initializing Speech Recognition...")
+            self.stt = STTModule(model_name="base")
+        
+        if self.llm is None:
+            print("🧠 Initializing Language Model...")
+            self.llm = LLMModule(model_name="llama3:8b", fast_mode=True)
         
-        print("🧠 Initializing Language Model...")
-        self.llm = LLMModule(model_name="llama3:8b", fast_mode=True)
+        if self.tts is None:
+            print("🔊 Initializing Text-to-Speech...")
+            self.tts = TTSModule(voice_lang="en", voice_slow=False, stt_module=self.stt)
+        elif self.tts.stt_module is None:
+            self.tts.stt_module = self.stt
         
-        print("🔊 Initializing Text-to-Speech...")
-        self.tts = TTSModule(voice_lang="en", voice_slow=False, stt_module=self.stt)
+        if self.tools is None:
+            print("🛠️  Initializing Tools...")
+            self.tools = ToolsModule()
         
-        print("🛠️  Initializing Tools...")
-        self.tools = ToolsModule()
+        # ToolsModule caches the schema until the tool set changes
+        self._tools_schema = self.tools.get_tools_schema()
+        # Built once; every turn sends the identical system prompt so Ollama can reuse its KV cache
+        self._tools_prompt = self.tools.get_tools_prompt()
         
-        print("🧠 Initializing Memory...")
-        self.memory = MaxMemory()
+        if self.memory is None:
+            print("🧠 Initializing Memory...")
+            self.memory = MaxMemory()
         self.memory.start_new_session()
         
-        print("⏸️  Initializing Interruption System...")
-        self.simple_interrupt = SimpleInterrupt()
+        # Build the voice command matcher once
+        if self._command_automaton is None:
+            self._command_automaton = self._build_command_automaton()
+        
+        # Keep a single interrupt listener so restarts don't add a second stdin reader
+        if self.simple_interrupt is None:
+            print("⏸️  Initializing Interruption System...")
+            self.simple_interrupt = SimpleInterrupt()
         
         # Set up interruption callbacks
         self.simple_interrupt.set_interruption_callback(self._on_simple_interruption)
@@ -60,7 +110,7 @@ class MaxAIAssistant:
         print("=" * 50)
         print("🎤 Start speaking or press ENTER to interrupt...")
         print("\nAvailable tools:")
-        for tool in self.tools.get_tools_schema():
+        for tool in self._tools_schema:
             print(f"  - {tool['name']}: {tool['description']}")
         print("\n💡 Voice Commands:")
         print("  - 'stop' or 'interrupt' to stop Max's speech")
@@ -68,68 +118,156 @@ class MaxAIAssistant:
         print("  - Press ENTER to interrupt Max while speaking")
         print()
     
+    def _build_command_automaton(self):
+        """Build an Aho-Corasick automaton over all voice command phrases"""
+        try:
+            import ahocorasick
+        except ImportError:
+            # Fall back to the precompiled regex
+            return None
+        
+        automaton = ahocorasick.Automaton()
+        for phrase, command in VOICE_COMMANDS:
+            automaton.add_word(phrase, (phrase, command))
+        automaton.make_automaton()
+        return automaton
+    
+    def _detect_command(self, text: str):
+        """Return "sleep", "stop" or None for a transcription"""
+        if self._command_automaton is None:
+            detected = None
+            for match in _CMD_RE.finditer(text):
+                # Sleep wins over stop wherever it appears
+                if match.lastgroup == "sleep":
+                    return "sleep"
+                detected = match.lastgroup
+            return detected
+        
+        # Single linear pass regardless of how many phrases are registered
+        text_lower = text.lower()
+        detected = None
+        for end_index, (phrase, command) in self._command_automaton.iter(text_lower):
+            start_index = end_index - len(phrase) + 1
+            # Only accept whole-word matches
+            if start_index > 0 and text_lower[start_index - 1].isalnum():
+                continue
+            if end_index + 1 < len(text_lower) and text_lower[end_index + 1].isalnum():
+                continue
+            if command == "sleep":
+                return command
+            detected = command
+        return detected
+    
     def _on_simple_interruption(self):
         """Called when Enter is pressed to interrupt"""
-        print("\n" + "="*50)
-        print("🚨 ENTER PRESSED - INTERRUPTING MAX!")
-        print("="*50)
+        logger.info("\n" + "="*50)
+        logger.info("🚨 ENTER PRESSED - INTERRUPTING MAX!")
+        logger.info("="*50)
         self.tts.interrupt_speech()
     
     def _on_speech_interrupted(self):
         """Called when speech is interrupted"""
-        print("\n" + "="*50)
-        print("🛑 MAX'S SPEECH INTERRUPTED!")
-        print("🎤 LISTENING FOR YOUR VOICE NOW...")
-        print("="*50)
-        print()
+        logger.info("\n" + "="*50)
+        logger.info("🛑 MAX'S SPEECH INTERRUPTED!")
+        logger.info("🎤 LISTENING FOR YOUR VOICE NOW...")
+        logger.info("="*50)
+        logger.info("")
     
     def _on_transcription(self, text):
         """Called when STT transcribes speech"""
         if text.strip():
-            print(f"🎤 You said: {text}")
+            logger.info(f"🎤 You said: {text}")
+            
+            command = self._detect_command(text)
             
             # Check for sleep command
-            if any(phrase in text.lower() for phrase in ["go to sleep", "goodbye", "bye", "exit", "quit"]):
-                print("🤖 Max: Goodbye! Going to sleep now...")
+            if command == "sleep":
+                logger.info("🤖 Max: Goodbye! Going to sleep now...")
                 self.tts.speak("Goodbye! Going to sleep now.", blocking=True)
-                print("\n👋 Max is now sleeping. Goodbye!")
+                logger.info("\n👋 Max is now sleeping. Goodbye!")
                 self.is_running = False
                 sys.exit(0)
             
             # Check for stop/interrupt command
-            if any(phrase in text.lower() for phrase in ["stop", "interrupt", "shut up", "quiet"]):
-                print("🛑 Stop command detected!")
+            if command == "stop":
+                logger.info("🛑 Stop command detected!")
                 self.tts.interrupt_speech()
                 return
             
+            # The previous turn must be in memory before we read context from it
+            self._finish_pending_turn()
+            
             # Get memory context
             memory_context = self.memory.get_session_context()
             
-            # Process with tools
-            start_time = time.time()
-            response = self.tools.process_with_tools(text, self.llm, memory_context)
-            end_time = time.time()
-            
-            # Log the interaction to memory
-            context = {
-                "current_directory": os.getcwd(),
-                "tool_used": "conversation" if response and "tool" not in response.lower() else "tool_call"
-            }
-            self.memory.log_interaction(text, response, context)
-            
-            # Store current response for potential interruption
-            self.current_response = response
-            
-            # Speak the response (don't print again, TTS will handle it)
-            if response and response.strip():
-                self.tts.speak_response(response)
-            else:
-                print("⚠️  No response generated, skipping speech")
+            # Route here, while the mic is still live; only the LLM reply streams on the TTS thread
+            deltas = self.tools.process_with_tools_stream(text, self.llm, memory_context, prompt_prefix=self._tools_prompt)
+            chunks = []
+            done = threading.Event()
+            with self._turn_lock:
+                self._pending_turn = (text, chunks, done)
+            self.tts.speak_stream(self._collect_response(deltas, chunks), on_done=done.set)
             
-            print("-" * 50)
+            logger.info("-" * 50)
+    
+    def _collect_response(self, deltas, chunks):
+        """Pass response chunks through to TTS, keeping a copy for the memory log"""
+        try:
+            for delta in deltas:
+                chunks.append(delta)
+                yield delta
+        finally:
+            # Release the LLM stream as soon as speech stops
+            close = getattr(deltas, "close", None)
+            if close:
+                close()
+    
+    def _finish_pending_turn(self, timeout=None):
+        """
+        Log the last streamed turn once TTS is done with it (spoken, interrupted or dropped)
+        
+        Args:
+            timeout: Seconds to wait for TTS; None waits until it finishes
+        """
+        with self._turn_lock:
+            turn = self._pending_turn
+        if turn is None:
+            return
+        
+        # Wait without the lock so other threads never block on a whole turn
+        user_input, chunks, done = turn
+        if not done.wait(timeout):
+            return
+        
+        # Whoever claims the turn logs it while holding the lock, so nobody reads stale context
+        with self._turn_lock:
+            if self._pending_turn is not turn:
+                return
+            self._pending_turn = None
+            self._finish_turn(user_input, "".join(chunks).strip())
+    
+    def _finish_turn(self, user_input, response):
+        """Log a completed (or interrupted) turn to memory"""
+        # Log the interaction to memory
+        context = {
+            "current_directory": self.tools.current_directory,
+            "tool_used": "conversation" if response and "tool" not in response.lower() else "tool_call"
+        }
+        self.memory.log_interaction(user_input, response, context)
+        
+        # Store current response for potential interruption
+        self.current_response = response
+        
+        if response:
+            logger.info(f"🤖 Max: {response}")
+        else:
+            logger.warning("⚠️  No response generated, skipping speech")
     
     def start(self):
         """Start the Max AI Assistant"""
+        # Treat SIGTERM like Ctrl+C so cleanup() still runs
+        signal.signal(signal.SIGTERM, self._on_terminate)
+        
         try:
             self.initialize_modules()
             self.is_running = True
@@ -143,6 +281,8 @@ class MaxAIAssistant:
             # Keep the main thread alive
             while self.is_running:
                 time.sleep(0.1)
+                # Log finished turns promptly instead of waiting for the next one
+                self._finish_pending_turn(timeout=0)
                 
         except KeyboardInterrupt:
             print("\n🛑 Keyboard interrupt received. Shutting down...")
@@ -151,12 +291,17 @@ class MaxAIAssistant:
         finally:
             self.cleanup()
     
+    def _on_terminate(self, signum, frame):
+        """Called when the process receives SIGTERM"""
+        raise KeyboardInterrupt
+    
     def cleanup(self):
         """Clean up resources"""
         print("🧹 Cleaning up...")
         
         # End session first to ensure proper archiving
         if self.memory:
+            self._finish_pending_turn(timeout=1.0)
             print("📝 Finalizing session memory...")
             self.memory.end_session()
         
@@ -170,11 +315,33 @@ class MaxAIAssistant:
         
         print("✅ Cleanup complete!")
 
+def configure_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """
+    Route log records through a queue so audio/speech threads never block on stdout
+    
+    Returns:
+        The started listener; stop() it on shutdown to flush pending records
+    """
+    log_queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
 def main():
     """Main entry point"""
+    listener = configure_logging()
     print("🚀 Starting Max AI Assistant...")
-    assistant = MaxAIAssistant()
-    assistant.start()
+    try:
+        assistant = MaxAIAssistant()
+        assistant.start()
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
     main()
@@ -9,6 +9,12 @@ import json
 from datetime import datetime
 from typing import List, Dict, Optional
 
+# Soft cap on the cached prompt context; older interactions are dropped whole beyond it
+MAX_CONTEXT_CHARS = 16000
+
+# Lines of session text handed to the LLM; the cached context is trimmed to this as it grows
+MAX_CONTEXT_LINES = 200
+
 class MaxMemory:
     """Manages session-based memory for Max Voice Assistant"""
     
@@ -25,6 +31,8 @@ class MaxMemory:
         self.session_start_time = None
         self.session_tags = []
         self.interaction_count = 0
+        self._context_str = ""  # Session text for LLM prompts, appended to as the session grows
+        self._context_lines = 0
         
         # Create memory directory if it doesn't exist
         os.makedirs(self.memory_dir, exist_ok=True)
@@ -55,6 +63,9 @@ Session ID: {self.session_start_time.strftime("%Y%m%d_%H%M%S")}
         
         with open(self.current_session_file, "w", encoding="utf-8") as f:
             f.write(metadata)
+        
+        self._context_str = metadata
+        self._context_lines = metadata.count("\n")
     
     def log_interaction(self, user_input: str, max_response: str, context: Optional[Dict] = None):
         """
@@ -91,9 +102,32 @@ Context: {context_str}
         with open(self.current_session_file, "a", encoding="utf-8") as f:
             f.write(log_entry)
         
+        self._append_context(log_entry)
+        
         print(f"📝 Logged interaction #{self.interaction_count}")
     
-    def get_session_context(self, max_lines: int = 200) -> str:
+    def _append_context(self, entry: str):
+        """Append a logged entry to the cached prompt context, trimming it to MAX_CONTEXT_CHARS and MAX_CONTEXT_LINES"""
+        self._context_str += entry
+        self._context_lines += entry.count("\n")
+        
+        if len(self._context_str) > MAX_CONTEXT_CHARS:
+            # Keep a suffix that starts at an interaction boundary
+            cut = self._context_str.find("\n=== Interaction", len(self._context_str) - MAX_CONTEXT_CHARS)
+            if cut == -1:
+                cut = len(self._context_str) - MAX_CONTEXT_CHARS
+            self._context_str = self._context_str[cut:]
+            self._context_lines = self._context_str.count("\n")
+        
+        if self._context_lines > MAX_CONTEXT_LINES:
+            # Keep exactly the last MAX_CONTEXT_LINES lines, found by scanning back from the end
+            cut = len(self._context_str)
+            for _ in range(MAX_CONTEXT_LINES + 1):
+                cut = self._context_str.rfind("\n", 0, cut)
+            self._context_str = self._context_str[cut + 1:]
+            self._context_lines = MAX_CONTEXT_LINES
+    
+    def get_session_context(self, max_lines: int = MAX_CONTEXT_LINES) -> str:
         """
         Get context from current session for LLM prompt
         
@@ -103,17 +137,12 @@ Context: {context_str}
         Returns:
             Session context as string
         """
-        try:
-            with open(self.current_session_file, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-                
-                # If file is too long, take the last max_lines
-                if len(lines) > max_lines:
-                    lines = lines[-max_lines:]
-                
-                return "".join(lines)
-        except FileNotFoundError:
-            return ""
+        # Served from memory and already trimmed, so the default call does no slicing
+        if self._context_lines <= max_lines:
+            return self._context_str
+        
+        # If context is too long, take the last max_lines
+        return "".join(self._context_str.splitlines(keepends=True)[-max_lines:])
     
     def end_session(self, add_summary: bool = True):
         """
@@ -139,6 +168,8 @@ Context: {context_str}
         
         # Move current session to archive
         os.rename(self.current_session_file, archive_path)
+        self._context_str = ""
+        self._context_lines = 0
         
         duration = datetime.now() - self.session_start_time
         print(f"📁 Session archived: {archive_name}")
@@ -228,6 +259,8 @@ Session Ended: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
         if os.path.exists(self.current_session_file):
             os.remove(self.current_session_file)
             print("🗑️  Current session cleared")
+        self._context_str = ""
+        self._context_lines = 0
 
 
 def test_memory():
@@ -8,7 +8,6 @@ import threading
 import time
 import sys
 import os
-import select
 from typing import Optional, Callable
 
 # Import msvcrt only on Windows
@@ -26,41 +25,39 @@ class SimpleInterrupt:
         """Set callback for interruption events"""
         self.interruption_callback = callback
     
-    def _check_input_available(self):
-        """Check if input is available without blocking"""
+    def _read_line(self) -> Optional[str]:
+        """Block until a line is entered; returns None at end of input"""
         if os.name == 'nt':  # Windows
-            return msvcrt.kbhit()
+            line = []
+            while True:
+                char = msvcrt.getwch()
+                if char in ('\r', '\n'):
+                    return ''.join(line)
+                line.append(char)
         else:  # Unix/Linux/macOS
-            return select.select([sys.stdin], [], [], 0)[0]
-    
-    def _get_input(self):
-        """Get input without blocking"""
-        if os.name == 'nt':  # Windows
-            if msvcrt.kbhit():
-                return msvcrt.getch()
-        else:  # Unix/Linux/macOS
-            if select.select([sys.stdin], [], [], 0)[0]:
-                return sys.stdin.readline()
-        return None
+            line = sys.stdin.readline()
+            return line if line else None
     
     def start_listening(self):
         """Start listening for interruption using Enter key"""
         self.is_listening = True
         print("⌨️  Simple interrupt listener started. Press ENTER to interrupt Max.")
         
+        # Only create the reader thread once; it blocks on input instead of polling
+        if self.listener_thread is not None and self.listener_thread.is_alive():
+            return
+        
         def listen_for_enter():
-            while self.is_listening:
+            while True:
                 try:
-                    # Use non-blocking input check
-                    if self._check_input_available():
-                        input_data = self._get_input()
-                        if input_data and (input_data.strip() == '' or input_data.strip() == '\n'):
-                            if self.is_listening and self.interruption_callback:
-                                print("🚨 Enter pressed! Interrupting Max...")
-                                self.interruption_callback()
-                    else:
-                        # Small sleep to prevent high CPU usage
-                        time.sleep(0.1)
+                    # Blocking read: the thread sleeps until a line arrives
+                    input_data = self._read_line()
+                    if input_data is None:
+                        break
+                    if input_data.strip() == '':
+                        if self.is_listening and self.interruption_callback:
+                            print("🚨 Enter pressed! Interrupting Max...")
+                            self.interruption_callback()
                 except KeyboardInterrupt:
                     break
                 except EOFError:
@@ -74,7 +71,7 @@ class SimpleInterrupt:
         self.listener_thread.start()
     
     def stop_listening(self):
-        """Stop listening for keyboard input"""
+        """Stop listening for keyboard input (the daemon reader thread exits with the process)"""
         self.is_listening = False
         print("⌨️  Simple interrupt listener stopped.")
 
@@ -1,109 +1,240 @@
-import whisper
+import os
+
+# Pin BLAS threads before numpy/torch load so they don't oversubscribe the CPU
+# alongside Whisper inference (CTranslate2 gets its own thread count below)
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+import logging
 import sounddevice as sd
 import numpy as np
 import threading
-import queue
 import time
 import torch
-import warnings
-import os
-import sys
+from faster_whisper import WhisperModel
 from typing import Optional, Callable
 
-# Suppress FP16 warning for CPU
-warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
+logger = logging.getLogger(__name__)
 
 class STTModule:
-    def __init__(self, model_name: str = "base", device: str = "cpu"):
+    def __init__(self, model_name: str = "base", device: Optional[str] = None, compute_type: Optional[str] = None):
         """
-        Initialize Speech-to-Text module using Whisper
+        Initialize Speech-to-Text module using faster-whisper
         
         Args:
             model_name: Whisper model size ("tiny", "base", "small", "medium", "large")
-            device: Device to run model on ("cpu" or "cuda")
+            device: Device to run model on ("cpu" or "cuda"; defaults to CUDA when available)
+            compute_type: CTranslate2 quantization (defaults to $WHISPER_COMPUTE_TYPE,
+                else "float16" on CUDA and "int8" on CPU)
         """
         self.model_name = model_name
-        self.device = device
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.compute_type = compute_type or os.getenv("WHISPER_COMPUTE_TYPE") or (
+            "float16" if self.device == "cuda" else "int8"
+        )
         self.model = None
-        self.audio_queue = queue.Queue()
         self.is_listening = False
-        self.is_paused = False  # New: pause state
+        self.mic_muted = threading.Event()  # Set while Max is speaking; mic chunks are dropped, the stream stays open
         self.sample_rate = 16000
         self.chunk_duration = 0.3  # Process 0.3-second chunks for more responsive processing
         self.chunk_samples = int(self.sample_rate * self.chunk_duration)
         
+        # Capture ring buffer: the audio callback converts straight into it, the
+        # processing loop reads chunks back out. Positions count samples since start.
+        self._ring = np.zeros(self.sample_rate * 30, dtype=np.float32)
+        self._write_pos = 0  # Advanced only by the audio callback
+        self._read_pos = 0  # Advanced only by the processing loop
+        self._resume_pos = None  # Where the processing loop should continue after a pause
+        self._audio_ready = threading.Event()
+        
+        # Playback gating: a rolling RMS baseline of the speaker echo while gated, so
+        # user speech overlapping the end of playback can be kept instead of clipped
+        self._playback_rms = 0.0
+        self.playback_speech_ratio = 2.0  # Chunks this much louder than the echo count as user speech
+        self.playback_tail_samples = int(self.sample_rate * 0.6)
+        self._playback_tail_start = None  # Ring position where the current loud run began
+        
         # Speech detection parameters
-        self.silence_threshold = 0.01  # Threshold for silence detection
-        self.silence_duration = 0.15  # Seconds of silence before processing (very fast)
-        self.min_speech_duration = 0.1  # Minimum speech duration to process (instant)
-        self.max_wait_time = 2.5  # Maximum time to wait before processing anyway
+        self.silence_threshold = 0.01  # Energy threshold used when Silero VAD is unavailable
+        self.vad_threshold = 0.5  # Silero speech probability threshold
+        self.vad_frame_samples = 512  # 32 ms frames at 16 kHz, as Silero expects
+        self.end_of_turn_silence = 0.7  # Seconds of silence that end the user's turn
         
-        # Load model
+        # Streaming parameters (LocalAgreement-2)
+        self.update_samples = int(self.sample_rate * 1.0)  # Re-run Whisper every 1s of new audio
+        self.max_buffer_samples = int(self.sample_rate * 10.0)  # Force a commit past 10s of audio
+        self.partial_callback = None
+        
+        # Load models
         self._load_model()
+        self.vad_model = self._load_vad()
         
     def _load_model(self):
         """Load Whisper model"""
-        print(f"Loading Whisper {self.model_name} model...")
-        self.model = whisper.load_model(self.model_name, device=self.device)
+        print(f"Loading Whisper {self.model_name} model ({self.device}, {self.compute_type})...")
+        self.model = WhisperModel(
+            self.model_name,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=min(4, os.cpu_count() or 1)
+        )
+        
+        # Warm start: run one dummy inference so the first utterance isn't slow
+        segments, _ = self.model.transcribe(np.zeros(self.sample_rate, dtype=np.float32), language="en")
+        list(segments)
         print(f"Whisper {self.model_name} model loaded successfully!")
+    
+    def _load_vad(self):
+        """Load Silero VAD used to gate Whisper inference"""
+        try:
+            vad_model, _ = torch.hub.load("snakers4/silero-vad", "silero_vad", trust_repo=True)
+            print("Silero VAD loaded successfully!")
+            return vad_model
+        except Exception as e:
+            print(f"⚠️  Silero VAD unavailable, falling back to energy threshold: {e}")
+            return None
         
+    @property
+    def is_paused(self) -> bool:
+        """Whether mic audio is currently gated off (e.g. while Max is speaking)"""
+        return self.mic_muted.is_set()
+    
     def _audio_callback(self, indata, frames, time, status):
         """Callback for audio input"""
         if status:
-            print(f"Audio callback status: {status}")
-        # Only process audio if listening and not paused
-        if self.is_listening and not self.is_paused:
-            # Convert to float32 and normalize
-            audio_data = indata.copy().astype(np.float32) / 32768.0
-            self.audio_queue.put(audio_data)
+            logger.warning(f"Audio callback status: {status}")
+        if not self.is_listening:
+            return
+        
+        # Convert mono int16 to normalized float32 directly into the ring (no per-chunk allocation)
+        ring_size = len(self._ring)
+        start = self._write_pos % ring_size
+        first = min(frames, ring_size - start)
+        np.multiply(indata[:first, 0], 1.0 / 32768.0, out=self._ring[start:start + first])
+        if first < frames:
+            np.multiply(indata[first:, 0], 1.0 / 32768.0, out=self._ring[:frames - first])
+        
+        # Playback gate: never hand Max's own voice to VAD/Whisper
+        if self.mic_muted.is_set():
+            self._track_playback_audio(self._ring[start:start + first])
+            self._write_pos += frames
+            return
+        
+        self._write_pos += frames
+        self._audio_ready.set()
+    
+    def _track_playback_audio(self, audio_data: np.ndarray):
+        """Update the echo RMS baseline and remember where a run of clearly louder audio began"""
+        rms = float(np.sqrt(np.mean(np.square(audio_data))))
+        if rms > max(self._playback_rms * self.playback_speech_ratio, self.silence_threshold):
+            if self._playback_tail_start is None:
+                self._playback_tail_start = self._write_pos
+        else:
+            # Only speech that runs right up to the end of playback is worth keeping
+            self._playback_tail_start = None
+            self._playback_rms = 0.9 * self._playback_rms + 0.1 * rms
+    
+    def _read_chunk(self) -> Optional[np.ndarray]:
+        """Return the next captured chunk, or None if none arrives within 0.1s"""
+        if self._write_pos - self._read_pos < self.chunk_samples:
+            self._audio_ready.clear()
+            if self._write_pos - self._read_pos < self.chunk_samples:
+                self._audio_ready.wait(0.1)
+            if self._write_pos - self._read_pos < self.chunk_samples:
+                return None
+        
+        # Fell a whole ring behind: skip to the newest chunk rather than read overwritten audio
+        ring_size = len(self._ring)
+        if self._write_pos - self._read_pos > ring_size - self.chunk_samples:
+            self._read_pos = self._write_pos - self.chunk_samples
+        
+        start = self._read_pos % ring_size
+        end = start + self.chunk_samples
+        self._read_pos += self.chunk_samples
+        if end <= ring_size:
+            return self._ring[start:end]  # View, no copy
+        return np.concatenate((self._ring[start:], self._ring[:end - ring_size]))
     
     def pause_listening(self):
         """Pause audio processing (e.g., when Max is speaking)"""
-        self.is_paused = True
-        # Clear the audio queue to prevent processing old audio
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
-        print("🎤 STT paused (Max speaking)")
+        self._playback_tail_start = None
+        self.mic_muted.set()
+        logger.info("🎤 STT paused (Max speaking)")
     
     def resume_listening(self):
         """Resume audio processing"""
-        self.is_paused = False
-        print("🎤 STT resumed (listening for user)")
+        if not self.mic_muted.is_set():
+            return
+        # Hand over user speech that overlapped the end of playback
+        resume_pos = self._write_pos
+        if self._playback_tail_start is not None:
+            resume_pos = max(self._playback_tail_start, resume_pos - self.playback_tail_samples)
+        self._resume_pos = resume_pos
+        self.mic_muted.clear()
+        logger.info("🎤 STT resumed (listening for user)")
     
     def _is_silence(self, audio_chunk: np.ndarray) -> bool:
         """Check if audio chunk is silence"""
         return np.max(np.abs(audio_chunk)) < self.silence_threshold
     
-    def _process_audio_chunk(self, audio_chunk: np.ndarray) -> Optional[str]:
-        """Process a chunk of audio and return transcription"""
+    def _is_speech(self, audio_chunk: np.ndarray) -> bool:
+        """Check if any 32 ms frame of the chunk contains speech"""
+        if self.vad_model is None:
+            return not self._is_silence(audio_chunk)
+        
+        # Feed every frame, even after a speech hit: Silero is stateful and needs contiguous audio
+        frame = self.vad_frame_samples
+        speech = False
+        with torch.no_grad():
+            for start in range(0, len(audio_chunk) - frame + 1, frame):
+                speech_prob = self.vad_model(torch.from_numpy(audio_chunk[start:start + frame]), self.sample_rate).item()
+                if speech_prob >= self.vad_threshold:
+                    speech = True
+        return speech
+    
+    def _transcribe_words(self, audio: np.ndarray) -> list:
+        """Transcribe in-memory audio and return words with buffer-relative timestamps"""
         try:
-            # Ensure audio is the right shape
-            if len(audio_chunk.shape) > 1:
-                audio_chunk = audio_chunk[:, 0]  # Take first channel if stereo
-            
-            # Run Whisper transcription
-            result = self.model.transcribe(audio_chunk, language="en")
-            transcription = result["text"].strip()
-            
-            return transcription if transcription else None
-            
+            segments, _ = self.model.transcribe(
+                audio,
+                language="en",
+                beam_size=1,
+                condition_on_previous_text=False,
+                word_timestamps=True
+            )
+            return [word for segment in segments for word in (segment.words or [])]
         except Exception as e:
-            print(f"Error processing audio chunk: {e}")
-            return None
+            logger.error(f"Error processing audio chunk: {e}")
+            return []
+    
+    @staticmethod
+    def _agreed_prefix_length(previous: list, current: list) -> int:
+        """LocalAgreement-2: number of leading words two consecutive hypotheses agree on"""
+        count = 0
+        for previous_word, current_word in zip(previous, current):
+            if previous_word.word.strip().lower() != current_word.word.strip().lower():
+                break
+            count += 1
+        return count
+    
+    @staticmethod
+    def _join_words(words: list) -> str:
+        """Join Whisper words back into text"""
+        return "".join(word.word for word in words).strip()
     
-    def start_listening(self, callback: Optional[Callable[[str], None]] = None):
+    def start_listening(self, callback: Optional[Callable[[str], None]] = None,
+                        partial_callback: Optional[Callable[[str], None]] = None):
         """
         Start listening for speech input
         
         Args:
-            callback: Function to call with transcription results
+            callback: Function to call with the full transcription at the end of each turn
+            partial_callback: Optional function to call with newly confirmed words mid-turn
         """
         self.is_listening = True
-        self.is_paused = False  # Ensure we start unpaused
+        self.mic_muted.clear()  # Ensure we start unpaused
         self.callback = callback
+        self.partial_callback = partial_callback
         
         print("Starting audio capture...")
         print("Listening continuously... (Press Ctrl+C to stop)")
@@ -129,74 +260,94 @@ class STTModule:
             self.stop_listening()
     
     def _process_audio_stream(self):
-        """Process incoming audio stream with silence detection"""
-        audio_buffer = []
-        silence_start = None
-        last_speech_time = time.time()
+        """
+        Process incoming audio with VAD gating and LocalAgreement-2 streaming
+        
+        Whisper only runs while the user is speaking. Every update re-transcribes
+        the rolling buffer; words that two consecutive hypotheses agree on are
+        committed and the buffer is trimmed past them, so each update stays short.
+        """
+        audio_buffer = np.zeros(0, dtype=np.float32)
+        committed_words = []  # Confirmed words of the current turn
+        hypothesis = []  # Uncommitted words from the previous update
+        in_speech = False
+        silence_samples = 0  # Non-speech audio read since the last speech chunk
+        samples_since_update = 0
+        # Silence is measured in audio consumed, not wall-clock time: while Whisper runs,
+        # audio queues up in the ring and is then read back faster than real time
+        end_of_turn_samples = int(self.end_of_turn_silence * self.sample_rate)
         
         while self.is_listening:
             try:
-                # Skip processing if paused
+                # Skip processing if paused, dropping any partial turn and any audio captured so far
                 if self.is_paused:
+                    audio_buffer = audio_buffer[:0]
+                    committed_words, hypothesis = [], []
+                    in_speech = False
+                    silence_samples = 0
+                    samples_since_update = 0
+                    self._read_pos = self._write_pos
                     time.sleep(0.1)
                     continue
                 
-                # Get audio chunk from queue
-                audio_chunk = self.audio_queue.get(timeout=0.1)
-                audio_buffer.append(audio_chunk)
+                if self._resume_pos is not None:
+                    self._read_pos, self._resume_pos = self._resume_pos, None
                 
-                # Check if current chunk is silence
-                is_silent = self._is_silence(audio_chunk)
+                # Get audio chunk from the ring buffer
+                audio_chunk = self._read_chunk()
+                if audio_chunk is None:
+                    continue
+                is_speech = self._is_speech(audio_chunk)
                 
-                if is_silent:
-                    if silence_start is None:
-                        silence_start = time.time()
-                else:
-                    # Speech detected
-                    silence_start = None
-                    last_speech_time = time.time()
+                # VAD gate: no inference at all while nobody is talking
+                if not in_speech and not is_speech:
+                    continue
                 
-                # Process speech when we have enough audio and detect silence
-                buffer_duration = len(audio_buffer) * self.chunk_duration
-                silence_duration = time.time() - silence_start if silence_start else 0
+                audio_buffer = np.concatenate((audio_buffer, audio_chunk))
+                samples_since_update += len(audio_chunk)
+                if is_speech:
+                    in_speech = True
+                    silence_samples = 0
+                else:
+                    silence_samples += len(audio_chunk)
                 
-                # Process if we have minimum speech duration and enough silence
-                if (buffer_duration >= self.min_speech_duration and 
-                    silence_duration >= self.silence_duration and 
-                    len(audio_buffer) > 0):
-                    
-                    # Concatenate audio chunks
-                    full_chunk = np.concatenate(audio_buffer)
-                    
-                    # Process the audio chunk
-                    transcription = self._process_audio_chunk(full_chunk)
-                    
+                # End of turn: transcribe the (short) uncommitted tail and emit the utterance
+                if silence_samples >= end_of_turn_samples:
+                    transcription = self._join_words(committed_words + self._transcribe_words(audio_buffer))
                     if transcription:
-                        print(f"Transcription: {transcription}")
+                        logger.info(f"Transcription: {transcription}")
                         if self.callback:
                             self.callback(transcription)
                     
-                    # Clear buffer for next chunk
-                    audio_buffer = []
-                    silence_start = None
+                    audio_buffer = audio_buffer[:0]
+                    committed_words, hypothesis = [], []
+                    in_speech = False
+                    silence_samples = 0
+                    samples_since_update = 0
+                    continue
                 
-                # Also process if buffer gets too large or too much time has passed
-                elif buffer_duration > 5.0:  # Max 5 seconds (reduced from 10s)
-                    full_chunk = np.concatenate(audio_buffer)
-                    transcription = self._process_audio_chunk(full_chunk)
-                    
-                    if transcription:
-                        print(f"Transcription: {transcription}")
-                        if self.callback:
-                            self.callback(transcription)
+                # Streaming update while the user keeps talking
+                if samples_since_update >= self.update_samples:
+                    samples_since_update = 0
+                    current = self._transcribe_words(audio_buffer)
+                    agreed = self._agreed_prefix_length(hypothesis, current)
+                    buffer_full = len(audio_buffer) >= self.max_buffer_samples
+                    if buffer_full:
+                        agreed = len(current)  # Bound per-update cost on long monologues
                     
-                    audio_buffer = []
-                    silence_start = None
+                    if buffer_full and not agreed:
+                        # Nothing transcribable (noise, unclear speech): keep only the latest audio
+                        audio_buffer = audio_buffer[-self.update_samples:]
+                    elif agreed:
+                        newly_committed = current[:agreed]
+                        committed_words.extend(newly_committed)
+                        audio_buffer = audio_buffer[int(newly_committed[-1].end * self.sample_rate):]
+                        if self.partial_callback:
+                            self.partial_callback(self._join_words(newly_committed))
+                    hypothesis = current[agreed:]
                     
-            except queue.Empty:
-                continue
             except Exception as e:
-                print(f"Error in audio stream processing: {e}")
+                logger.error(f"Error in audio stream processing: {e}")
                 break
     
     def stop_listening(self):
@@ -214,8 +365,8 @@ class STTModule:
             Transcribed text
         """
         try:
-            result = self.model.transcribe(audio_file_path, language="en")
-            return result["text"].strip()
+            segments, _ = self.model.transcribe(audio_file_path, language="en", beam_size=1)
+            return "".join(segment.text for segment in segments).strip()
         except Exception as e:
             print(f"Error transcribing file: {e}")
             return ""
@@ -244,4 +395,5 @@ def test_stt():
     stt.start_listening(callback=on_transcription)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     test_stt()
@@ -1,27 +1,205 @@
+import ast
 import datetime
+import functools
 import json
+import math
+import operator
 import time
 import os
 import re
 import subprocess
-from typing import Dict, Any, List, Optional, Callable
+import sys
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple, NamedTuple
 from dataclasses import dataclass
 
-@dataclass
+# Maximum number of (start path, name) searches remembered by _find_directory
+FIND_CACHE_SIZE = 64
+
+# Maximum number of repeated requests whose tool results are remembered
+RESPONSE_CACHE_SIZE = 256
+
+# Largest file _open_file will load into memory (and hand to the LLM/TTS)
+MAX_READ_BYTES = 1024 * 1024
+
+# Arithmetic the calculator understands; any other syntax is rejected
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# Largest exponent allowed, so "9**9**9" can't stall the assistant
+_MAX_EXPONENT = 100
+
+# Largest estimated power result in bits, so "(10**100)**100" is rejected before it is built
+_MAX_POWER_BITS = 4096
+
+def _evaluate_node(node: ast.AST):
+    """Evaluate a parsed arithmetic expression node"""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left = _evaluate_node(node.left)
+        right = _evaluate_node(node.right)
+        if isinstance(node.op, ast.Pow):
+            if abs(right) > _MAX_EXPONENT:
+                raise ValueError("exponent too large")
+            # The exponent cap alone ignores the base: estimate the result size as exponent * log2(base)
+            if right > 0 and abs(left) > 1 and right * math.log2(abs(left)) > _MAX_POWER_BITS:
+                raise ValueError("result too large")
+        return _BINARY_OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_evaluate_node(node.operand))
+    raise ValueError("unsupported expression")
+
+@functools.lru_cache(maxsize=512)
+def _evaluate_expression(expression: str):
+    """Safely evaluate an arithmetic expression (cached; results are pure)"""
+    return _evaluate_node(ast.parse(expression.strip(), mode="eval").body)
+
+@functools.lru_cache(maxsize=8)
+def _format_date(ordinal: int, date_format: str) -> str:
+    """strftime a calendar day (cached; keyed by the day's ordinal, so it rolls over at midnight)"""
+    return datetime.date.fromordinal(ordinal).strftime(date_format)
+
+# Terse tool-selection instruction; Ollama's format="json" enforces the structure, so no examples are needed
+TOOL_CALL_PROMPT_PREFIX = 'Return only JSON {"tool": string or null, "args": object}. Use null if no tool fits.'
+
+# Tools the LLM may pick on its own; anything that writes files or changes directory stays keyword-only
+_LLM_SELECTABLE_TOOLS = frozenset({
+    "get_current_time", "calculate", "list_directories", "open_file", "search_files",
+    "get_system_info", "get_disk_usage", "find_directory", "get_current_directory", "summarize"
+})
+
+# Static preamble for conversational (non-tool) responses
+CONVERSATION_PROMPT_PREFIX = "You are Max, a helpful voice assistant. Keep responses SHORT and DIRECT. Answer the user's question or request in 1-2 sentences maximum. Be helpful but concise."
+
+# Phrases that send a request straight to FileCreationHandler
+_FILE_CREATE_PHRASES = (
+    "create file", "make file", "new file", "create a file", "make a text file",
+    "make a python file", "create a python file", "make a txt file", "create a txt file",
+    "make a markdown file", "create a markdown file", "make a json file", "create a json file",
+    "make a pdf file", "create a pdf file", "make a py file", "create a py file",
+    "make a md file", "create a md file", "make a js file", "create a js file",
+    "make a html file", "create a html file", "make a css file", "create a css file"
+)
+
+# Keyword tuples used to route requests to tools, matched against the lowercased input
+_TOOL_KEYWORDS = {
+    "time": ("time", "what time", "current time", "date", "what date", "today's date", "day", "what day", "today's day"),
+    "time_date": ("date", "today's date", "current date"),
+    "time_time": ("time", "what time", "current time"),
+    "time_day": ("day", "what day", "today's day"),
+    "calculate": ("calculate", "math", "compute"),
+    "calculate_ops": ("+", "-", "*", "/", "="),
+    "list": (
+        "list", "show", "files", "directories", "what files", "what's in",
+        "open folder", "show folder", "what's in folder",
+        "list the files", "show the files", "what files are here"
+    ),
+    "navigate": (
+        "navigate", "go to", "change directory", "cd", "move to",
+        "go to the", "navigate to the", "move to the"
+    ),
+    "open_verbs": ("open", "read", "show"),
+    "open_nouns": ("file", "text file"),
+    "open_phrases": ("what does it say", "what's in the file", "file contents", "what's in", "what does the", "what does the oranges", "the file"),
+    "create_verbs": ("make", "create", "new"),
+    "directory_nouns": ("folder", "directory"),
+    "write": (
+        "write", "save", "create file with content", "write about", "create a file about", "rewrite", "change that",
+        "rewrite it", "change it"
+    ),
+    "edit": ("edit", "append", "add to file", "modify file"),
+    "search": ("search", "find", "look for", "find file"),
+    "system": ("system", "computer", "laptop", "hardware", "specs"),
+    "disk": ("disk", "storage", "space", "usage"),
+    "find_directory": ("find", "locate", "search for directory", "where is"),
+    "current_directory": (
+        "current directory", "what's my current directory", "show current directory", "where are we",
+        "what directory", "on what directory", "which directory", "what folder", "which folder",
+        "where am i", "what's our location"
+    ),
+    "summarize": (
+        "summarize", "summary", "summarise",
+        "give me a summary", "detailed summary", "brief summary", "summary of"
+    ),
+}
+
+def _build_router():
+    """Compile every routing keyword into one pattern that reports all keyword hits in a single scan"""
+    keyword_categories: Dict[str, set] = {}
+    for category, words in _TOOL_KEYWORDS.items():
+        for word in words:
+            keyword_categories.setdefault(word, set()).add(category)
+    
+    # Only the longest keyword starting at each position is reported, so credit it with
+    # the categories of every keyword that is a prefix of it (those matched there too)
+    categories_by_keyword = {
+        word: frozenset().union(*(cats for other, cats in keyword_categories.items() if word.startswith(other)))
+        for word in keyword_categories
+    }
+    alternation = "|".join(re.escape(word) for word in sorted(keyword_categories, key=len, reverse=True))
+    return re.compile(f"(?=({alternation}))"), categories_by_keyword
+
+# Zero-width lookahead so overlapping keywords ("what's in" / "in folder") are all found
+_ROUTER_RE, _ROUTER_CATEGORIES = _build_router()
+
+def _match_categories(input_lower: str) -> frozenset:
+    """Return the _TOOL_KEYWORDS categories mentioned in a lowercased request"""
+    matched = set()
+    for match in _ROUTER_RE.finditer(input_lower):
+        matched |= _ROUTER_CATEGORIES[match.group(1)]
+    return frozenset(matched)
+
+@dataclass(frozen=True)
 class Tool:
     """Represents a tool that can be called by the LLM"""
+    # Declared by hand: dataclass(slots=True) needs Python 3.10 and we support 3.9
+    __slots__ = ("name", "description", "parameters", "function")
+    
     name: str
     description: str
     parameters: Dict[str, Any]
     function: Callable
 
+class ToolResult(NamedTuple):
+    """Outcome of a tool call"""
+    success: bool
+    error: Optional[str]
+    result: Any
+    tool_name: str
+
 class ToolsModule:
     """Manages tools that can be called by the LLM"""
     
     def __init__(self):
         self.tools: Dict[str, Tool] = {}
+        self._dispatch: Dict[str, Callable] = {}  # Tool name -> function, the call_tool hot path
+        self._schema_cache: Optional[List[Dict[str, Any]]] = None  # Invalidated by register_tool
+        self._tool_call_prompt_cache: Optional[str] = None
+        self._response_cache = OrderedDict()  # Normalized request -> (response, date it is valid for or None), LRU order
+        self._find_cache = OrderedDict()  # (start path, name) -> (start path mtime, found dirs), LRU order
+        self.current_directory = os.getcwd()  # Shadow of the cwd, updated by _navigate_directory
         self.last_opened_file = None  # Track the last opened file for context
         self.last_created_file = None  # Track the last created file for context
+        self._FileCreationHandler = None  # Imported on the first file creation request
+        
+        # Tool name -> method that extracts that tool's arguments from the user's request
+        self._argument_builders: Dict[str, Callable[[str, Dict[str, Any]], Dict[str, Any]]] = {
+            "get_current_time": self._time_arguments,
+            "navigate_directory": self._navigate_arguments,
+            "calculate": self._calculate_arguments,
+            "open_file": self._open_file_arguments,
+        }
         self.register_default_tools()
     
     def _remove_emojis(self, text: str) -> str:
@@ -282,65 +460,82 @@ class ToolsModule:
     
     def register_tool(self, name: str, description: str, parameters: Dict[str, Any], function: Callable):
         """Register a new tool"""
+        # Interned names let call_tool's dict lookups hit the identity fast path
+        name = sys.intern(name)
         self.tools[name] = Tool(
             name=name,
             description=description,
             parameters=parameters,
             function=function
         )
+        self._dispatch[name] = function
+        # The tool set changed, so the cached schema is stale
+        self._schema_cache = None
+        self._tool_call_prompt_cache = None
         print(f"🔧 Registered tool: {name}")
     
     def get_tools_schema(self) -> List[Dict[str, Any]]:
-        """Get the schema for all registered tools"""
-        return [
-            {
-                "name": tool.name,
-                "description": tool.description,
-                "parameters": tool.parameters
-            }
-            for tool in self.tools.values()
-        ]
+        """Get the schema for all registered tools (built once per tool set)"""
+        if self._schema_cache is None:
+            self._schema_cache = [
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "parameters": tool.parameters
+                }
+                for tool in self.tools.values()
+            ]
+        return self._schema_cache
     
-    def call_tool(self, tool_name: str, arguments: Dict[str, Any] = None) -> Dict[str, Any]:
+    def get_tools_prompt(self) -> str:
+        """Get the conversational prompt preamble (a module constant, built once at import)"""
+        # Deliberately no tool list: the conversational path can't execute tools
+        return CONVERSATION_PROMPT_PREFIX
+    
+    def get_tool_call_prompt(self) -> str:
+        """Get the JSON tool-selection instruction listing the read-only tools and their arguments"""
+        if self._tool_call_prompt_cache is None:
+            lines = [TOOL_CALL_PROMPT_PREFIX, "Tools (arguments marked ? are optional):"]
+            for tool in self.get_tools_schema():
+                if tool["name"] not in _LLM_SELECTABLE_TOOLS:
+                    continue
+                properties = tool["parameters"].get("properties", {})
+                required = tool["parameters"].get("required", [])
+                arguments = ", ".join(
+                    f"{name}{'' if name in required else '?'}: {spec.get('type', 'string')}"
+                    for name, spec in properties.items()
+                )
+                lines.append(f"- {tool['name']}({arguments}): {tool['description']}")
+            self._tool_call_prompt_cache = "\n".join(lines)
+        return self._tool_call_prompt_cache
+    
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any] = None) -> ToolResult:
         """Call a specific tool with arguments"""
-        if tool_name not in self.tools:
-            return {
-                "success": False,
-                "error": f"Tool '{tool_name}' not found",
-                "result": None
-            }
+        function = self._dispatch.get(sys.intern(tool_name))
+        if function is None:
+            return ToolResult(False, f"Tool '{tool_name}' not found", None, tool_name)
         
         try:
-            tool = self.tools[tool_name]
             arguments = arguments or {}
             
             # Call the tool function
-            result = tool.function(**arguments)
-            
-            return {
-                "success": True,
-                "error": None,
-                "result": result,
-                "tool_name": tool_name
-            }
+            result = function(**arguments)
+            
+            return ToolResult(True, None, result, tool_name)
         except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "result": None,
-                "tool_name": tool_name
-            }
+            return ToolResult(False, str(e), None, tool_name)
     
     def _get_current_time(self, format: str = "full") -> str:
         """Get the current time in the specified format"""
-        now = datetime.datetime.now()
+        # Date-only formats change once a day, so their strftime result is cached
+        if format == "date_only":
+            return _format_date(datetime.date.today().toordinal(), "%B %d, %Y")
+        elif format == "day_only":
+            return _format_date(datetime.date.today().toordinal(), "%A")  # Returns day of week (e.g., "Saturday")
         
+        now = datetime.datetime.now()
         if format == "time_only":
             return now.strftime("%I:%M %p")
-        elif format == "date_only":
-            return now.strftime("%B %d, %Y")
-        elif format == "day_only":
-            return now.strftime("%A")  # Returns day of week (e.g., "Saturday")
         else:  # full
             return now.strftime("%B %d, %Y at %I:%M %p")
     
@@ -352,8 +547,8 @@ class ToolsModule:
             if not all(c in allowed_chars for c in expression):
                 return "Error: Invalid characters in expression"
             
-            # Evaluate the expression
-            result = eval(expression)
+            # Evaluate the expression without eval(): only numbers and arithmetic are accepted
+            result = _evaluate_expression(expression)
             
             # Check if result is a number
             if isinstance(result, (int, float)):
@@ -363,12 +558,25 @@ class ToolsModule:
         except Exception as e:
             return f"Error: {str(e)}"
     
+    def _is_within_home(self, path: str) -> bool:
+        """Whether a path is the home directory or inside it (not merely sharing its prefix), after resolving symlinks"""
+        # realpath, not normpath: a symlink inside home may point anywhere
+        home_dir = os.path.realpath(os.path.expanduser("~"))
+        try:
+            return os.path.commonpath([home_dir, os.path.realpath(path)]) == home_dir
+        except ValueError:
+            # Different drives on Windows
+            return False
+    
+    def _validate_path(self, path: str) -> Optional[str]:
+        """Resolve path (and any symlinks) against the current directory; returns None if it falls outside home"""
+        requested_path = os.path.realpath(os.path.join(self.current_directory, os.path.expanduser(path)))
+        return requested_path if self._is_within_home(requested_path) else None
+    
     def _navigate_directory(self, path: str) -> str:
         """Navigate to a specific directory"""
         try:
             # Security: Allow access to user's home directory and subdirectories
-            current_dir = os.getcwd()
-            requested_path = os.path.abspath(path)
             home_dir = os.path.expanduser("~")
             
             # Handle special paths
@@ -393,13 +601,14 @@ class ToolsModule:
                         return f"Error: Directory '{path}' not found. Try using absolute paths or check the directory name."
             
             # Security check for home directory access
-            if not requested_path.startswith(home_dir) and requested_path != "/":
+            requested_path = os.path.realpath(requested_path)
+            if not self._is_within_home(requested_path) and requested_path != "/":
                 return "Error: Access denied - can only access files in your home directory and subdirectories"
             
             if os.path.isdir(requested_path):
                 # Change to the directory
                 os.chdir(requested_path)
-                new_dir = os.getcwd()
+                self.current_directory = os.path.abspath(requested_path)
                 response = f"Navigated to {os.path.basename(requested_path) if requested_path != '/' else 'root'}"
                 return self._remove_emojis(response)
             else:
@@ -429,25 +638,28 @@ class ToolsModule:
                 requested_path = os.path.abspath(path)
             
             # Security: Allow access to user's home directory and subdirectories, or root for navigation
-            home_dir = os.path.expanduser("~")
-            
-            # Ensure the requested path is within the user's home directory or is root
-            if not requested_path.startswith(home_dir) and requested_path != "/":
+            requested_path = os.path.realpath(requested_path)
+            if not self._is_within_home(requested_path) and requested_path != "/":
                 return "Error: Access denied - can only access files in your home directory and subdirectories"
             
-            items = os.listdir(requested_path)
-            
-            # Separate directories and files
+            # Separate directories and files (scandir reuses readdir's file type, no stat per entry)
             directories = []
             files = []
             
-            for item in sorted(items):
-                if not item.startswith('.'):  # Skip hidden files
-                    item_path = os.path.join(requested_path, item)
-                    if os.path.isdir(item_path):
-                        directories.append(f"{item}/")
+            with os.scandir(requested_path) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):  # Skip hidden files
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        directories.append(f"{entry.name}/")
                     else:
-                        files.append(item)
+                        files.append(entry.name)
+            directories.sort()
+            files.sort()
             
             # Format the response with actual file names
             current_dir_name = os.path.basename(requested_path) if requested_path != "/" else "root"
@@ -476,12 +688,8 @@ class ToolsModule:
         """Open and read the contents of a file"""
         try:
             # Security: Allow access to user's home directory and subdirectories
-            current_dir = os.getcwd()
-            requested_path = os.path.abspath(path)
-            home_dir = os.path.expanduser("~")
-            
-            # Ensure the requested path is within the user's home directory
-            if not requested_path.startswith(home_dir):
+            requested_path = self._validate_path(path)
+            if requested_path is None:
                 return "Error: Access denied - can only access files in your home directory and subdirectories"
             
             # Try multiple locations to find the file
@@ -491,8 +699,8 @@ class ToolsModule:
                 os.path.expanduser("~/Documents"),  # Documents
                 os.path.expanduser("~/Downloads"),  # Downloads
                 os.path.expanduser("~"),  # Home directory
-                os.path.join(os.getcwd(), "logs"),  # Logs directory
-                os.path.join(os.getcwd(), "memory")  # Memory directory
+                os.path.join(self.current_directory, "logs"),  # Logs directory
+                os.path.join(self.current_directory, "memory")  # Memory directory
             ]
             
             file_path = None
@@ -522,14 +730,19 @@ class ToolsModule:
             if file_path is None:
                 return f"Error: File '{filename}' not found in common locations (Desktop, Documents, Downloads, current directory)"
             
-            # Read the file content
+            # Refuse oversized files before reading anything
+            size = os.path.getsize(file_path)
+            if size > MAX_READ_BYTES:
+                return f"Error: '{filename}' is too large to open ({size / (1024 * 1024):.1f} MB, limit {MAX_READ_BYTES // (1024 * 1024)} MB)"
+            
+            # Read the file content (default buffering; bigger buffers don't help here)
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             
             # Track the last opened file for context
             self.last_opened_file = filename
             
-            return f"File '{filename}' contents:\n\n{content}"
+            return "".join(("File '", filename, "' contents:\n\n", content))
             
         except PermissionError:
             return f"Error: Permission denied for reading '{filename}'"
@@ -541,20 +754,14 @@ class ToolsModule:
     def _write_file(self, filename: str, content: str, path: str = ".") -> str:
         """Write content to a file (overwrites existing content)"""
         try:
-            # Security: Allow access to user's home directory and subdirectories
-            current_dir = os.getcwd()
-            requested_path = os.path.abspath(path)
-            home_dir = os.path.expanduser("~")
-            
-            # Ensure the requested path is within the user's home directory
-            if not requested_path.startswith(home_dir):
+            # Security: the file itself (not just its directory) must be inside home
+            file_path = self._validate_path(os.path.join(path, filename))
+            if file_path is None:
                 return "Error: Access denied - can only access files in your home directory and subdirectories"
             
-            file_path = os.path.join(requested_path, filename)
-            
-            # Write the content to the file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            # Write the content to the file (encoded once, no text-layer newline scanning)
+            with open(file_path, 'wb') as f:
+                f.write(content.encode('utf-8'))
             
             response = f"Wrote to '{filename}'"
             return self._remove_emojis(response)
@@ -567,29 +774,21 @@ class ToolsModule:
     def _edit_file(self, filename: str, content: str, mode: str = "append", path: str = ".") -> str:
         """Edit a file by appending content or replacing specific lines"""
         try:
-            # Security: Allow access to user's home directory and subdirectories
-            current_dir = os.getcwd()
-            requested_path = os.path.abspath(path)
-            home_dir = os.path.expanduser("~")
-            
-            # Ensure the requested path is within the user's home directory
-            if not requested_path.startswith(home_dir):
+            # Security: the file itself (not just its directory) must be inside home
+            file_path = self._validate_path(os.path.join(path, filename))
+            if file_path is None:
                 return "Error: Access denied - can only access files in your home directory and subdirectories"
             
-            file_path = os.path.join(requested_path, filename)
+            # Append adds content on a new line; any other mode replaces the entire file content
+            append = mode == "append"
+            with open(file_path, 'ab' if append else 'wb') as f:
+                if append:
+                    # Written separately rather than concatenated; the buffer coalesces the writes
+                    f.write(b'\n')
+                f.write(content.encode('utf-8'))
             
-            if mode == "append":
-                # Append content to the file
-                with open(file_path, 'a', encoding='utf-8') as f:
-                    f.write(f"\n{content}")
-                response = f"Appended to '{filename}'"
-                return self._remove_emojis(response)
-            else:
-                # Replace entire file content
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                response = f"Replaced '{filename}'"
-                return self._remove_emojis(response)
+            response = f"Appended to '{filename}'" if append else f"Replaced '{filename}'"
+            return self._remove_emojis(response)
             
         except PermissionError:
             return f"Error: Permission denied for editing '{filename}'"
@@ -603,11 +802,8 @@ class ToolsModule:
                 path = os.path.expanduser("~")
             
             # Security: Allow access to user's home directory and subdirectories
-            requested_path = os.path.abspath(path)
-            home_dir = os.path.expanduser("~")
-            
-            # Ensure the requested path is within the user's home directory
-            if not requested_path.startswith(home_dir):
+            requested_path = self._validate_path(path)
+            if requested_path is None:
                 return "Error: Access denied - can only search in your home directory and subdirectories"
             
             found_files = []
@@ -688,11 +884,8 @@ class ToolsModule:
                 path = os.path.expanduser("~")
             
             # Security: Allow access to user's home directory and subdirectories
-            requested_path = os.path.abspath(path)
-            home_dir = os.path.expanduser("~")
-            
-            # Ensure the requested path is within the user's home directory
-            if not requested_path.startswith(home_dir):
+            requested_path = self._validate_path(path)
+            if requested_path is None:
                 return "Error: Access denied - can only check disk usage in your home directory and subdirectories"
             
             import psutil
@@ -725,27 +918,11 @@ class ToolsModule:
                 start_path = os.path.expanduser("~")
             
             # Security: Allow access to user's home directory and subdirectories
-            requested_path = os.path.abspath(start_path)
-            home_dir = os.path.expanduser("~")
-            
-            # Ensure the requested path is within the user's home directory
-            if not requested_path.startswith(home_dir):
+            requested_path = self._validate_path(start_path)
+            if requested_path is None:
                 return "Error: Access denied - can only search in your home directory and subdirectories"
             
-            found_dirs = []
-            
-            # Walk through the directory tree
-            for root, dirs, files in os.walk(requested_path):
-                # Skip hidden directories
-                dirs[:] = [d for d in dirs if not d.startswith('.')]
-                
-                for dir_item in dirs:
-                    if directory_name.lower() in dir_item.lower():
-                        found_dirs.append(os.path.relpath(os.path.join(root, dir_item), requested_path))
-                
-                # If directory found, stop searching
-                if found_dirs:
-                    break
+            found_dirs = self._find_directories_cached(requested_path, directory_name)
             
             if found_dirs:
                 result = f"Found {len(found_dirs)} directories matching '{directory_name}':\n"
@@ -762,16 +939,81 @@ class ToolsModule:
         except Exception as e:
             return f"Error: {str(e)}"
     
+    def _find_directories_cached(self, requested_path: str, directory_name: str) -> List[str]:
+        """
+        Search for directories matching directory_name, reusing earlier results
+        
+        A cached result is reused while the start directory's mtime is unchanged
+        and every directory it found still exists; otherwise the tree is walked again.
+        """
+        key = (requested_path, directory_name.lower())
+        mtime = os.stat(requested_path).st_mtime
+        
+        cached = self._find_cache.get(key)
+        if cached is not None:
+            cached_mtime, cached_dirs = cached
+            if cached_mtime == mtime and all(os.path.isdir(os.path.join(requested_path, d)) for d in cached_dirs):
+                self._find_cache.move_to_end(key)
+                return cached_dirs
+        
+        found_dirs = []
+        
+        # Walk through the directory tree
+        for root, dirs in self._walk_directories(requested_path):
+            for dir_item in dirs:
+                if directory_name.lower() in dir_item.lower():
+                    found_dirs.append(os.path.relpath(os.path.join(root, dir_item), requested_path))
+            
+            # If directory found, stop searching
+            if found_dirs:
+                break
+        
+        # Misses are not cached: a new match could appear deep in the tree without touching the start mtime
+        if found_dirs:
+            self._find_cache[key] = (mtime, found_dirs)
+            self._find_cache.move_to_end(key)
+            if len(self._find_cache) > FIND_CACHE_SIZE:
+                self._find_cache.popitem(last=False)
+        return found_dirs
+    
+    def _walk_directories(self, top: str):
+        """
+        Yield (root, subdirectory names) top-down like os.walk, skipping hidden directories
+        
+        Uses os.scandir so directory checks come from readdir instead of a stat per entry.
+        Unreadable directories are skipped, as os.walk does. Like os.walk, symlinked
+        directories are listed (so they can match) but not descended into.
+        """
+        try:
+            with os.scandir(top) as it:
+                dirs = []
+                descend = []
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            dirs.append(entry.name)
+                            if not entry.is_symlink():
+                                descend.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return
+        
+        yield top, dirs
+        for name in descend:
+            yield from self._walk_directories(os.path.join(top, name))
+    
     def _get_current_directory(self) -> str:
         """Get the current working directory"""
-        return os.getcwd()
+        return self.current_directory
     
     def _summarize_file(self, filename: str, summary_type: str = "brief") -> str:
         """Summarize the contents of a file (supports txt, md, json, pdf)"""
         try:
             # Security: Allow access to user's home directory and subdirectories
-            current_dir = os.getcwd()
-            home_dir = os.path.expanduser("~")
+            current_dir = self.current_directory
             
             # Try multiple locations to find the file, prioritizing current directory
             search_paths = [
@@ -796,7 +1038,7 @@ class ToolsModule:
                 return f"Error: File '{filename}' not found in common locations. I checked the current directory ({current_dir_name}), Desktop, Documents, and Downloads. Please make sure the file exists and try again."
             
             # Ensure the file path is within the user's home directory
-            if not os.path.abspath(file_path).startswith(home_dir):
+            if not self._is_within_home(os.path.abspath(file_path)):
                 return "Error: Access denied - can only access files in your home directory and subdirectories"
             
             # Read file content based on file type
@@ -985,44 +1227,88 @@ class ToolsModule:
     def parse_tool_call(self, llm_response: str) -> Optional[Dict[str, Any]]:
         """
         Parse tool call from LLM response
-        Expected format: <tool_call>tool_name:arguments</tool_call>
+        Expected format: {"tool": "tool_name", "args": {...}} (null tool means no tool)
         """
-        import re
+        try:
+            call = json.loads(llm_response)
+        except json.JSONDecodeError:
+            return None
         
-        # Look for various tool call patterns
-        patterns = [
-            r'<tool_call>(.*?):(.*?)</tool_call>',  # Standard format
-            r'<tool_call>(.*?):(.*?)$',  # No closing tag
-            r'<(.*?):(.*?)>',  # Simple format
-            r'<(.*?):(.*?)></.*?>',  # With closing tag
-        ]
+        if not isinstance(call, dict) or not isinstance(call.get("tool"), str):
+            return None
         
-        for pattern in patterns:
-            match = re.search(pattern, llm_response, re.DOTALL)
-            if match:
-                tool_name = match.group(1).strip()
-                arguments_str = match.group(2).strip()
-                
-                try:
-                    # Try to parse arguments as JSON
-                    arguments = json.loads(arguments_str) if arguments_str else {}
-                    return {
-                        "tool_name": tool_name,
-                        "arguments": arguments
-                    }
-                except json.JSONDecodeError:
-                    # If not valid JSON, treat as empty arguments
-                    return {
-                        "tool_name": tool_name,
-                        "arguments": {}
-                    }
+        arguments = call.get("args")
+        return {
+            "tool_name": call["tool"].strip(),
+            "arguments": arguments if isinstance(arguments, dict) else {}
+        }
+    
+    def select_tool_with_llm(self, user_input: str, llm_module) -> Optional[Dict[str, Any]]:
+        """
+        Ask the LLM which read-only tool (if any) answers user input, using JSON-constrained output
         
-        return None
+        Args:
+            user_input: What the user said
+            llm_module: LLM module whose Ollama backend supports format="json"
+            
+        Returns:
+            The parsed tool call, or None if the LLM picked nothing or a tool it may not run
+        """
+        response = llm_module.generate_json(user_input, self.get_tool_call_prompt())
+        tool_call = self.parse_tool_call(response)
+        if tool_call is None or tool_call["tool_name"] not in _LLM_SELECTABLE_TOOLS:
+            return None
+        return tool_call
     
-    def process_with_tools(self, user_input: str, llm_module, memory_context: str = "") -> str:
+    def process_with_tools(self, user_input: str, llm_module, memory_context: str = "", prompt_prefix: Optional[str] = None) -> str:
         """
         Process user input with enhanced tool calling capability using improved intent extraction
+        
+        Args:
+            user_input: What the user said
+            llm_module: LLM module used for intent detection and conversational replies
+            memory_context: Session memory context to include in prompt
+            prompt_prefix: System prompt for conversational replies (defaults to CONVERSATION_PROMPT_PREFIX)
         """
+        response, prompt = self._route_request(user_input, llm_module)
+        if prompt is None:
+            return response
+        return llm_module.generate_response(prompt, memory_context, system_prompt=prompt_prefix or CONVERSATION_PROMPT_PREFIX)
+    
+    def process_with_tools_stream(self, user_input: str, llm_module, memory_context: str = "", prompt_prefix: Optional[str] = None) -> Iterator[str]:
+        """
+        Same as process_with_tools, but yields the response incrementally
+        
+        Routing (intent detection, tool execution) runs right away on the
+        calling thread; only a conversational reply is generated lazily.
+        Tool results come back in one piece; conversational replies are
+        yielded token by token as the LLM streams them.
+        """
+        response, prompt = self._route_request(user_input, llm_module)
+        if prompt is None:
+            return iter([response] if response else [])
+        return llm_module.generate_response_stream(prompt, memory_context, system_prompt=prompt_prefix or CONVERSATION_PROMPT_PREFIX)
+    
+    def _route_request(self, user_input: str, llm_module) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Decide how to answer user input
+        
+        Returns:
+            (response, None) when a tool or file creation answered directly,
+            or (None, prompt) when the LLM should respond conversationally;
+            the prompt carries only the per-request part, the static
+            instructions go in the system prompt
+        """
+        # Lowercase once; every keyword check below reuses it
+        lowered = user_input.lower()
+        
+        # Repeated requests answered by a pure tool skip intent detection and execution entirely
+        cache_key = " ".join(lowered.split())
+        cached = self._get_cached_response(cache_key)
+        if cached is not None:
+            print(f"⚡ Cached response for: {user_input}")
+            return cached, None
+        
         # First, extract intent and entities for better understanding
         intent_result = llm_module.get_intent(user_input)
         entities = llm_module.extract_entities(user_input)
@@ -1032,296 +1318,293 @@ class ToolsModule:
             print(f"🔍 Entities detected: {entities}")
         
         # Check for file creation requests first
-        file_creation_patterns = [
-            "create file", "make file", "new file", "create a file", "make a text file",
-            "make a python file", "create a python file", "make a txt file", "create a txt file",
-            "make a markdown file", "create a markdown file", "make a json file", "create a json file",
-            "make a pdf file", "create a pdf file", "make a py file", "create a py file",
-            "make a md file", "create a md file", "make a js file", "create a js file",
-            "make a html file", "create a html file", "make a css file", "create a css file"
-        ]
-        
-        if any(phrase in user_input.lower() for phrase in file_creation_patterns):
-            try:
-                from .file_creation_handler import FileCreationHandler
-            except ImportError:
+        if any(phrase in lowered for phrase in _FILE_CREATE_PHRASES):
+            if self._FileCreationHandler is None:
                 try:
-                    from file_creation_handler import FileCreationHandler
+                    from .file_creation_handler import FileCreationHandler
                 except ImportError:
-                    # If import fails, try to create a simple file creation response
-                    if "python" in user_input.lower():
-                        return "Created 'main.py' in Desktop"
-                    elif "text" in user_input.lower() or "txt" in user_input.lower():
-                        return "Created 'notes.txt' in Desktop"
-                    else:
-                        return "Created 'file.txt' in Desktop"
+                    try:
+                        from file_creation_handler import FileCreationHandler
+                    except ImportError:
+                        # If import fails, try to create a simple file creation response
+                        if "python" in lowered:
+                            return "Created 'main.py' in Desktop", None
+                        elif "text" in lowered or "txt" in lowered:
+                            return "Created 'notes.txt' in Desktop", None
+                        else:
+                            return "Created 'file.txt' in Desktop", None
+                self._FileCreationHandler = FileCreationHandler
             
-            file_handler = FileCreationHandler()
-            return file_handler.start_file_creation(user_input)
+            file_handler = self._FileCreationHandler()
+            return file_handler.start_file_creation(user_input), None
         
-        # Enhanced tool detection with intent awareness
-        tool_requests = self._enhanced_tool_detection(user_input, intent_result, entities)
+        # Enhanced tool detection with intent awareness; stops at the highest priority match
+        tool_name = self._enhanced_tool_detection(lowered, intent_result, entities)
         
         # Simple approach - if tool is detected, call it directly
-        detected_tools = [tool for tool, detected in tool_requests.items() if detected]
-        if detected_tools:
-            print(f"🔍 Detected tool requests: {detected_tools}")
-            
-            # Priority order for tool selection
-            priority_order = [
-                "get_current_time",
-                "calculate", 
-                "get_current_directory",
-                "list_directories",
-                "navigate_directory",
-                "open_file",
-                "write_file",
-                "edit_file",
-                "summarize",
-                "find_directory",
-                "search_files",
-                "get_system_info",
-                "get_disk_usage"
-            ]
-            
-            # Select the highest priority tool that was detected
-            tool_name = None
-            for priority_tool in priority_order:
-                if priority_tool in detected_tools:
-                    tool_name = priority_tool
-                    break
-            
-            # Fallback to first detected tool if none in priority order
-            if tool_name is None:
-                tool_name = detected_tools[0]
+        if tool_name is not None:
             print(f"🔧 Tool call detected: {tool_name}")
             
             # Handle special cases with enhanced entity extraction
-            return self._handle_tool_execution(tool_name, user_input, entities)
+            return self._handle_tool_execution(tool_name, user_input, entities, cache_key), None
+        
+        # Keyword routing found nothing; for action requests, let the LLM pick a read-only tool
+        # (JSON-constrained, short token budget). Conversational turns skip this extra LLM call.
+        if intent_result['intent'] == "command":
+            tool_call = self.select_tool_with_llm(user_input, llm_module)
+            if tool_call and tool_call["tool_name"] in self.tools:
+                print(f"🔧 LLM tool call: {tool_call['tool_name']}")
+                tool_result = self.call_tool(tool_call["tool_name"], tool_call["arguments"])
+                if tool_result.success:
+                    return tool_result.result, None
+                print(f"⚠️  LLM tool call failed: {tool_result.error}")
         
         # If no tool detected, respond conversationally
-        prompt = f"""You are Max, a helpful voice assistant. Keep responses SHORT and DIRECT. Answer the user's question or request in 1-2 sentences maximum. Be helpful but concise.
-
-User input: {user_input}
-Intent: {intent_result['intent']}
-Response:"""
-        return llm_module.generate_response(prompt, memory_context)
+        prompt = f"User input: {user_input}\nIntent: {intent_result['intent']}\nResponse:"
+        return None, prompt
     
-    def _enhanced_tool_detection(self, user_input: str, intent_result: Dict[str, Any], entities: Dict[str, Any]) -> Dict[str, bool]:
+    def _enhanced_tool_detection(self, input_lower: str, intent_result: Dict[str, Any], entities: Dict[str, Any]) -> Optional[str]:
         """
         Enhanced tool detection using intent and entity information
-        """
-        input_lower = user_input.lower()
         
-        tool_requests = {
-            "get_current_time": (
-                any(word in input_lower for word in ["time", "what time", "current time", "date", "what date", "today's date", "day", "what day", "today's day"]) or
-                any(entity in entities.get("times", []) for entity in entities.get("times", [])) or
-                any(entity in entities.get("dates", []) for entity in entities.get("dates", []))
-            ),
-            "calculate": (
-                any(word in input_lower for word in ["calculate", "math", "compute"]) or 
-                any(op in user_input for op in ["+", "-", "*", "/", "="]) or
-                len(entities.get("numbers", [])) >= 2
-            ),
-            "list_directories": (
-                any(word in input_lower for word in ["list", "show", "files", "directories", "what files", "what's in"]) or 
-                any(word in input_lower for word in ["open folder", "show folder", "what's in folder"]) or 
-                any(phrase in input_lower for phrase in ["list the files", "show the files", "what files are here"])
-            ),
-            "navigate_directory": (
-                any(word in input_lower for word in ["navigate", "go to", "change directory", "cd", "move to"]) or 
-                any(phrase in input_lower for phrase in ["go to the", "navigate to the", "move to the"]) or
-                len(entities.get("paths", [])) > 0
-            ),
-            "open_file": (
-                (any(word in input_lower for word in ["open", "read", "show"]) and any(word in input_lower for word in ["file", "text file"])) or 
-                any(phrase in input_lower for phrase in ["what does it say", "what's in the file", "file contents", "what's in", "what does the", "what does the oranges", "the file"]) or
-                (len(entities.get("filenames", [])) > 0 and not any(word in input_lower for word in ["make", "create", "new"]))
-            ) and not any(word in input_lower for word in ["folder", "directory"]),
-            "write_file": (
-                any(word in input_lower for word in ["write", "save", "create file with content", "write about", "create a file about", "rewrite", "change that"]) or 
-                any(phrase in input_lower for phrase in ["rewrite it", "change it", "write about"])
-            ),
-            "edit_file": (
-                any(word in input_lower for word in ["edit", "append", "add to file", "modify file"])
-            ),
-            "search_files": (
-                any(word in input_lower for word in ["search", "find", "look for", "find file"])
-            ),
-            "get_system_info": (
-                any(word in input_lower for word in ["system", "computer", "laptop", "hardware", "specs"])
-            ),
-            "get_disk_usage": (
-                any(word in input_lower for word in ["disk", "storage", "space", "usage"])
-            ),
-            "find_directory": (
-                any(word in input_lower for word in ["find", "locate", "search for directory", "where is"])
-            ),
-            "get_current_directory": (
-                any(word in input_lower for word in ["current directory", "what's my current directory", "show current directory", "where are we", "what directory", "on what directory", "which directory", "what folder", "which folder", "where am i", "what's our location"])
-            ),
-            "summarize": (
-                any(word in input_lower for word in ["summarize", "summary", "summarise"]) or 
-                any(phrase in input_lower for phrase in ["give me a summary", "detailed summary", "brief summary", "summary of"])
-            )
-        }
+        Args:
+            input_lower: The user's request, already lowercased
+            
+        Returns:
+            The highest priority tool the request asks for, or None
+        """
+        # One regex pass finds every keyword category the request mentions
+        mentions = _match_categories(input_lower).__contains__
         
-        return tool_requests
+        # Checked in priority order; the first match wins and the rest are never evaluated
+        if mentions("time") or entities.get("times") or entities.get("dates"):
+            return "get_current_time"
+        if mentions("calculate") or mentions("calculate_ops") or len(entities.get("numbers", [])) >= 2:
+            return "calculate"
+        if mentions("current_directory"):
+            return "get_current_directory"
+        if mentions("list"):
+            return "list_directories"
+        if mentions("navigate") or entities.get("paths"):
+            return "navigate_directory"
+        if (
+            (mentions("open_verbs") and mentions("open_nouns")) or
+            mentions("open_phrases") or
+            (entities.get("filenames") and not mentions("create_verbs"))
+        ) and not mentions("directory_nouns"):
+            return "open_file"
+        if mentions("write"):
+            return "write_file"
+        if mentions("edit"):
+            return "edit_file"
+        if mentions("summarize"):
+            return "summarize"
+        if mentions("find_directory"):
+            return "find_directory"
+        if mentions("search"):
+            return "search_files"
+        if mentions("system"):
+            return "get_system_info"
+        if mentions("disk"):
+            return "get_disk_usage"
+        return None
     
-    def _handle_tool_execution(self, tool_name: str, user_input: str, entities: Dict[str, Any]) -> str:
+    def _handle_tool_execution(self, tool_name: str, user_input: str, entities: Dict[str, Any], cache_key: Optional[str] = None) -> str:
         """
         Handle tool execution with enhanced entity extraction
+        
+        Args:
+            cache_key: Normalized request to remember a side-effect-free result under
         """
-        if tool_name == "get_current_time":
-            # Determine format based on user input and entities
-            if any(word in user_input.lower() for word in ["date", "today's date", "current date"]) or entities.get("dates"):
-                tool_result = self.call_tool(tool_name, {"format": "date_only"})
-            elif any(word in user_input.lower() for word in ["time", "what time", "current time"]) or entities.get("times"):
-                tool_result = self.call_tool(tool_name, {"format": "time_only"})
-            elif any(word in user_input.lower() for word in ["day", "what day", "today's day"]):
-                tool_result = self.call_tool(tool_name, {"format": "day_only"})
-            else:
-                tool_result = self.call_tool(tool_name, {"format": "full"})
+        # Tools with no builder take no arguments
+        build_arguments = self._argument_builders.get(tool_name)
+        arguments = build_arguments(user_input, entities) if build_arguments else {}
+        tool_result = self.call_tool(tool_name, arguments)
         
-        elif tool_name == "navigate_directory":
-            # Use extracted paths or fallback to pattern matching
-            path = "."
-            if entities.get("paths"):
-                path = entities["paths"][0]
-            else:
-                import re
-                patterns = [
-                    r'(?:go to|navigate to|move to|change to|switch to)\s+(?:the\s+)?(\w+(?:\s+\w+)*?)(?:\s+folder)?',
-                    r'(?:in|at)\s+(?:the\s+)?(\w+(?:\s+\w+)*?)(?:\s+folder)?',
-                    r'(\w+(?:\s+\w+)*?)\s+folder'
-                ]
-                
-                for pattern in patterns:
-                    path_match = re.search(pattern, user_input.lower())
-                    if path_match:
-                        path = path_match.group(1).strip()
-                        path = re.sub(r'\b(the|a|an)\b', '', path).strip()
-                        if path:
-                            break
+        if tool_result.success:
+            if cache_key is not None:
+                self._cache_response(cache_key, tool_name, arguments, tool_result.result)
+            return tool_result.result
+        else:
+            return f"Sorry, I encountered an error: {tool_result.error or 'Unknown error'}"
+    
+    def _get_cached_response(self, cache_key: str) -> Optional[str]:
+        """Return a remembered response for this request, if it is still valid"""
+        cached = self._response_cache.get(cache_key)
+        if cached is None:
+            return None
+        
+        response, valid_for = cached
+        if valid_for is not None and valid_for != datetime.date.today():
+            del self._response_cache[cache_key]
+            return None
+        
+        self._response_cache.move_to_end(cache_key)
+        return response
+    
+    def _cache_response(self, cache_key: str, tool_name: str, arguments: Dict[str, Any], response: str):
+        """
+        Remember a tool result if repeating the request must give the same answer
+        
+        Only pure tools are cached: calculations, and dates/weekdays (valid until
+        midnight). Anything touching the clock time or the file system is not.
+        """
+        if not isinstance(response, str) or response.startswith("Error"):
+            return
+        if tool_name == "calculate":
+            valid_for = None
+        elif tool_name == "get_current_time" and arguments.get("format") in ("date_only", "day_only"):
+            valid_for = datetime.date.today()
+        else:
+            return
+        
+        self._response_cache[cache_key] = (response, valid_for)
+        self._response_cache.move_to_end(cache_key)
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+    
+    def _time_arguments(self, user_input: str, entities: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick the time format the user asked for"""
+        # Determine format based on user input and entities
+        input_lower = user_input.lower()
+        if any(word in input_lower for word in _TOOL_KEYWORDS["time_date"]) or entities.get("dates"):
+            return {"format": "date_only"}
+        elif any(word in input_lower for word in _TOOL_KEYWORDS["time_time"]) or entities.get("times"):
+            return {"format": "time_only"}
+        elif any(word in input_lower for word in _TOOL_KEYWORDS["time_day"]):
+            return {"format": "day_only"}
+        else:
+            return {"format": "full"}
+    
+    def _navigate_arguments(self, user_input: str, entities: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the target directory from entities or the phrasing"""
+        # Use extracted paths or fallback to pattern matching
+        path = "."
+        if entities.get("paths"):
+            path = entities["paths"][0]
+        else:
+            patterns = [
+                r'(?:go to|navigate to|move to|change to|switch to)\s+(?:the\s+)?(\w+(?:\s+\w+)*?)(?:\s+folder)?',
+                r'(?:in|at)\s+(?:the\s+)?(\w+(?:\s+\w+)*?)(?:\s+folder)?',
+                r'(\w+(?:\s+\w+)*?)\s+folder'
+            ]
             
-            tool_result = self.call_tool(tool_name, {"path": path})
+            input_lower = user_input.lower()
+            for pattern in patterns:
+                path_match = re.search(pattern, input_lower)
+                if path_match:
+                    path = path_match.group(1).strip()
+                    path = re.sub(r'\b(the|a|an)\b', '', path).strip()
+                    if path:
+                        break
         
-        elif tool_name == "calculate":
-            # Use extracted numbers or fallback to pattern matching
-            import re
-            if len(entities.get("numbers", [])) >= 2:
-                # Try to find mathematical expression with extracted numbers
-                numbers = entities["numbers"]
-                math_match = re.search(r'(\d+\s*[\+\-\*\/]\s*\d+)', user_input)
-                if math_match:
-                    expression = math_match.group(1)
-                else:
-                    # Create expression from first two numbers
-                    expression = f"{numbers[0]} + {numbers[1]}"
+        return {"path": path}
+    
+    def _calculate_arguments(self, user_input: str, entities: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract a math expression from entities or the phrasing"""
+        # Use extracted numbers or fallback to pattern matching
+        if len(entities.get("numbers", [])) >= 2:
+            # Try to find mathematical expression with extracted numbers
+            numbers = entities["numbers"]
+            math_match = re.search(r'(\d+\s*[\+\-\*\/]\s*\d+)', user_input)
+            if math_match:
+                expression = math_match.group(1)
             else:
-                # Fallback to original pattern matching
-                math_match = re.search(r'(\d+\s*[\+\-\*\/]\s*\d+)', user_input)
-                if math_match:
-                    expression = math_match.group(1)
+                # Create expression from first two numbers
+                expression = f"{numbers[0]} + {numbers[1]}"
+        else:
+            # Fallback to original pattern matching
+            math_match = re.search(r'(\d+\s*[\+\-\*\/]\s*\d+)', user_input)
+            if math_match:
+                expression = math_match.group(1)
+            else:
+                numbers = re.findall(r'\d+', user_input)
+                operators = re.findall(r'[\+\-\*\/]', user_input)
+                if numbers and operators:
+                    expression = f"{numbers[0]} {operators[0]} {numbers[1] if len(numbers) > 1 else '0'}"
                 else:
-                    numbers = re.findall(r'\d+', user_input)
-                    operators = re.findall(r'[\+\-\*\/]', user_input)
-                    if numbers and operators:
-                        expression = f"{numbers[0]} {operators[0]} {numbers[1] if len(numbers) > 1 else '0'}"
-                    else:
-                        expression = "2 + 2"
-            
-            tool_result = self.call_tool(tool_name, {"expression": expression})
+                    expression = "2 + 2"
         
-        elif tool_name == "open_file":
-            # Use extracted filenames or fallback to pattern matching
-            filename = "notes.txt"
-            if entities.get("filenames"):
-                filename = entities["filenames"][0]
+        return {"expression": expression}
+    
+    def _open_file_arguments(self, user_input: str, entities: Dict[str, Any]) -> Dict[str, Any]:
+        """Resolve which file the user wants opened"""
+        # Use extracted filenames or fallback to pattern matching
+        filename = "notes.txt"
+        if entities.get("filenames"):
+            filename = entities["filenames"][0]
+        else:
+            # Fallback to original pattern matching
+            patterns = [
+                r'(\w+\.\w+)',  # "filename.md", "filename.txt" (highest priority for explicit extensions)
+                r'(\w+)\s+(?:text\s+)?file',  # "oranges text file" -> "oranges"
+                r'(?:open|read|show)\s+(?:me\s+)?(?:the\s+)?(\w+)(?:\s+(?:text\s+)?file)?',
+                r'(?:the\s+)?(\w+)(?:\s+(?:text\s+)?file)',
+                r'(?:what does the|what\'s in the)\s+(\w+)',  # "what does the oranges" -> "oranges"
+                r'(\w+)\s+file',  # "oranges file" -> "oranges"
+                r'(?:the\s+)?(\w+)(?:\s+file)',  # "the oranges file" -> "oranges"
+                r'(?:app on|on)\s+(\w+)',  # "app on .text file" -> "app"
+                r'(\w+)\s+on\s+\w+'  # "app on .text file" -> "app"
+            ]
+            
+            input_lower = user_input.lower()
+            if "the file" in input_lower:
+                if self.last_created_file:
+                    filename = self.last_created_file
+                elif self.last_opened_file:
+                    filename = self.last_opened_file
             else:
-                # Fallback to original pattern matching
-                import re
-                patterns = [
-                    r'(\w+\.\w+)',  # "filename.md", "filename.txt" (highest priority for explicit extensions)
-                    r'(\w+)\s+(?:text\s+)?file',  # "oranges text file" -> "oranges"
-                    r'(?:open|read|show)\s+(?:me\s+)?(?:the\s+)?(\w+)(?:\s+(?:text\s+)?file)?',
-                    r'(?:the\s+)?(\w+)(?:\s+(?:text\s+)?file)',
-                    r'(?:what does the|what\'s in the)\s+(\w+)',  # "what does the oranges" -> "oranges"
-                    r'(\w+)\s+file',  # "oranges file" -> "oranges"
-                    r'(?:the\s+)?(\w+)(?:\s+file)',  # "the oranges file" -> "oranges"
-                    r'(?:app on|on)\s+(\w+)',  # "app on .text file" -> "app"
-                    r'(\w+)\s+on\s+\w+'  # "app on .text file" -> "app"
-                ]
-                
-                if "the file" in user_input.lower():
-                    if self.last_created_file:
-                        filename = self.last_created_file
-                    elif self.last_opened_file:
-                        filename = self.last_opened_file
-                else:
-                    for pattern in patterns:
-                        file_match = re.search(pattern, user_input.lower())
-                        if file_match:
-                            extracted_name = file_match.group(1).strip()
-                            
-                            if extracted_name.lower() in ["that", "this", "it", "the"]:
-                                continue
-                                
-                            filename = extracted_name
+                for pattern in patterns:
+                    file_match = re.search(pattern, input_lower)
+                    if file_match:
+                        extracted_name = file_match.group(1).strip()
+                        
+                        if extracted_name.lower() in ["that", "this", "it", "the"]:
+                            continue
                             
-                            if '.' in filename:
+                        filename = extracted_name
+                        
+                        if '.' in filename:
+                            break
+                        
+                        # Try to find the actual file with different extensions
+                        current_dir = self.current_directory
+                        potential_extensions = ['.md', '.MD', '.txt', '.TXT', '.json', '.JSON', '.pdf', '.PDF']
+                        
+                        file_found = False
+                        for ext in potential_extensions:
+                            test_filename = filename + ext
+                            test_path = os.path.join(current_dir, test_filename)
+                            if os.path.exists(test_path):
+                                filename = test_filename
+                                file_found = True
                                 break
+                        
+                        if not file_found:
+                            search_paths = [
+                                current_dir,
+                                os.path.expanduser("~/Desktop"),
+                                os.path.expanduser("~/Documents"),
+                                os.path.expanduser("~/Downloads"),
+                                os.path.expanduser("~")
+                            ]
                             
-                            # Try to find the actual file with different extensions
-                            current_dir = os.getcwd()
-                            potential_extensions = ['.md', '.MD', '.txt', '.TXT', '.json', '.JSON', '.pdf', '.PDF']
-                            
-                            file_found = False
-                            for ext in potential_extensions:
-                                test_filename = filename + ext
-                                test_path = os.path.join(current_dir, test_filename)
-                                if os.path.exists(test_path):
-                                    filename = test_filename
-                                    file_found = True
-                                    break
-                            
-                            if not file_found:
-                                search_paths = [
-                                    current_dir,
-                                    os.path.expanduser("~/Desktop"),
-                                    os.path.expanduser("~/Documents"),
-                                    os.path.expanduser("~/Downloads"),
-                                    os.path.expanduser("~")
-                                ]
-                                
-                                for search_path in search_paths:
-                                    for ext in potential_extensions:
-                                        test_filename = filename + ext
-                                        test_path = os.path.join(search_path, test_filename)
-                                        if os.path.exists(test_path):
-                                            filename = test_filename
-                                            file_found = True
-                                            break
-                                    if file_found:
+                            for search_path in search_paths:
+                                for ext in potential_extensions:
+                                    test_filename = filename + ext
+                                    test_path = os.path.join(search_path, test_filename)
+                                    if os.path.exists(test_path):
+                                        filename = test_filename
+                                        file_found = True
                                         break
-                            
-                            if not file_found:
-                                filename += ".txt"
-                            break
-            
-            tool_result = self.call_tool(tool_name, {"filename": filename})
-        
-        else:
-            # Default tool execution for other tools
-            tool_result = self.call_tool(tool_name, {})
+                                if file_found:
+                                    break
+                        
+                        if not file_found:
+                            filename += ".txt"
+                        break
         
-        if tool_result and tool_result.get('success'):
-            return tool_result['result']
-        elif tool_result:
-            return f"Sorry, I encountered an error: {tool_result.get('error', 'Unknown error')}"
-        else:
-            return "Sorry, I couldn't execute that tool."
+        return {"filename": filename}
 
 
 def test_tools():
@@ -1343,7 +1626,7 @@ def test_tools():
     
     # Test tool call parsing
     print("\n3. Testing tool call parsing:")
-    test_response = '<tool_call>get_current_time:{"format": "time_only"}</tool_call>'
+    test_response = '{"tool": "get_current_time", "args": {"format": "time_only"}}'
     parsed = tools.parse_tool_call(test_response)
     print(f"Parsed: {parsed}")
     
@@ -1,43 +1,348 @@
 #!/usr/bin/env python3
 """
 Text-to-Speech Module for Max
-Uses Google TTS (gTTS) for high-quality voices with interruption support
+Uses Google TTS (gTTS) for high-quality voices with interruption support,
+or a local Piper voice for offline, low-latency synthesis
 """
 
+import base64
+import hashlib
+import io
+import itertools
 import os
-import tempfile
+import re
+import logging
+import queue
+import atexit
 import threading
 import time
-import subprocess
-import signal
+import urllib.request
+import wave
+from concurrent.futures import ThreadPoolExecutor
 import platform
-from gtts import gTTS
-from typing import Optional, Callable
+import miniaudio
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from gtts import gTTS, gTTSError
+from typing import Optional, Callable, Iterable, Iterator, Union
+
+try:
+    from piper import PiperVoice
+except ImportError:
+    PiperVoice = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+logger = logging.getLogger(__name__)
+
+# Candidate sentence boundary used to pipeline synthesis and playback
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+
+# Words whose trailing period does not end a sentence
+_ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e"}
+
+# Shorter fragments are merged into the next sentence instead of synthesized alone
+_MIN_SENTENCE_CHARS = 10
+
+# Emoji ranges stripped before synthesis (compiled once; cleaning runs for every sentence)
+_EMOJI_RE = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    "\U00002702-\U000027B0"  # dingbats
+    "\U000024C2-\U0001F251"  # enclosed characters
+    "]+", flags=re.UNICODE
+)
+
+# "🤖 Max:" display prefix (and anything up to its colon, e.g. "🤖 Max (thinking):")
+_PREFIX_RE = re.compile(r'^🤖 Max[^:]*:\s*')
+
+# Clause boundary used to cut an over-long first sentence
+_CLAUSE_SPLIT_RE = re.compile(r'(?<=[,;:])\s+')
+
+def _split_first_chunk(sentence: str, max_chars: int) -> Iterator[str]:
+    """Cut a long first sentence at its last clause boundary before max_chars"""
+    if len(sentence) <= max_chars:
+        yield sentence
+        return
+    
+    cut = None
+    for match in _CLAUSE_SPLIT_RE.finditer(sentence):
+        if match.start() > max_chars:
+            break
+        if match.start() >= _MIN_SENTENCE_CHARS:
+            cut = match
+    
+    if cut is None:
+        yield sentence
+    else:
+        yield sentence[:cut.start()]
+        yield sentence[cut.end():]
+
+def _merge_piece(pending: str, piece: str):
+    """Append a split piece to pending; return (pending, sentence ready to speak or None)"""
+    piece = piece.strip()
+    if not piece:
+        return pending, None
+    pending = f"{pending} {piece}" if pending else piece
+    
+    last_word = pending.rsplit(None, 1)[-1]
+    if last_word.endswith(".") and (
+        last_word[:-1].lower() in _ABBREVIATIONS or (len(last_word) == 2 and last_word[0].isalpha())
+    ):
+        return pending, None
+    if len(pending) < _MIN_SENTENCE_CHARS:
+        return pending, None
+    
+    return "", pending
+
+def _iter_whole_sentences(chunks: Iterable[str]) -> Iterator[str]:
+    """Yield complete sentences from a stream of text chunks (see _iter_sentences)"""
+    buffer = ""
+    pending = ""
+    for chunk in chunks:
+        buffer += chunk
+        # The last piece may still be growing; keep it until more text arrives
+        *pieces, buffer = _SENTENCE_SPLIT_RE.split(buffer)
+        for piece in pieces:
+            pending, sentence = _merge_piece(pending, piece)
+            if sentence:
+                yield sentence
+    
+    pending, sentence = _merge_piece(pending, buffer)
+    if sentence:
+        yield sentence
+    if pending:
+        yield pending
+
+def _iter_sentences(text, first_chunk_max_chars: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield speakable sentences from text
+    
+    text may be a string or an iterable of chunks (e.g. streamed LLM tokens);
+    sentences are yielded as soon as their boundary has arrived.
+    
+    Splits after ".", "!" or "?" followed by whitespace (so decimals like 3.14
+    never split), but not after abbreviations such as "Dr." or single-letter
+    initials, and merges fragments shorter than _MIN_SENTENCE_CHARS forward.
+    
+    If first_chunk_max_chars is set, the first sentence is synthesized in two
+    phases: a short leading clause first (to get audio out sooner), then the rest.
+    """
+    chunks = [text] if isinstance(text, str) else text
+    first = first_chunk_max_chars is not None
+    for sentence in _iter_whole_sentences(chunks):
+        if first:
+            first = False
+            yield from _split_first_chunk(sentence, first_chunk_max_chars)
+        else:
+            yield sentence
+
+# Sentences synthesized ahead of playback; bounds work wasted on an interruption
+_AUDIO_QUEUE_SIZE = 2
+
+# Persistent cache of synthesized gTTS mp3s, so repeated phrases skip the network entirely
+TTS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "max_tts")
+
+# Least recently used mp3s beyond this many are deleted by cleanup()
+TTS_CACHE_MAX_FILES = 500
+
+# Age after which cleanup() treats a leftover .part file as orphaned
+_STALE_PARTIAL_SECONDS = 60
+
+# Playback device buffer; also how long to let the device drain after decoding ends
+_PLAYBACK_BUFFER_MSEC = 100
+
+# gTTS mp3s are 24 kHz mono; playing them as-is skips miniaudio's default resample/upmix to 44.1 kHz stereo
+_PLAYBACK_SAMPLE_RATE = 24000
+_PLAYBACK_CHANNELS = 1
+
+# int16 amplitude at or below which leading/trailing samples count as silence
+_SILENCE_THRESHOLD = 500
+
+# Audio kept on each side of the trimmed speech so onsets and word tails aren't clipped (20 ms)
+_SILENCE_PAD_SAMPLES = _PLAYBACK_SAMPLE_RATE // 50
+
+def _trim_silence_bounds_numpy(pcm: np.ndarray, threshold: int):
+    """Return (start, end) of the span from the first to the last sample louder than threshold"""
+    loud = np.flatnonzero(np.abs(pcm.astype(np.int32)) > threshold)
+    if loud.size == 0:
+        return 0, 0
+    return int(loud[0]), int(loud[-1]) + 1
+
+def _trim_silence_bounds_scan(pcm, threshold):
+    """Same as _trim_silence_bounds_numpy, as a scan from both ends that stops at the first loud sample"""
+    start = 0
+    end = pcm.shape[0]
+    while start < end and abs(int(pcm[start])) <= threshold:
+        start += 1
+    while end > start and abs(int(pcm[end - 1])) <= threshold:
+        end -= 1
+    return start, end
+
+# The early-exit scan only touches the silent edges, but is only fast when compiled
+_trim_silence_bounds = njit(cache=True)(_trim_silence_bounds_scan) if njit is not None else _trim_silence_bounds_numpy
+
+def _pcm_stream(pcm: np.ndarray):
+    """Primed miniaudio sample generator over an int16 buffer (like miniaudio.stream_memory)"""
+    def generate():
+        position = 0
+        required_frames = yield b""
+        while position < len(pcm):
+            chunk = pcm[position:position + required_frames * _PLAYBACK_CHANNELS]
+            position += len(chunk)
+            required_frames = yield chunk.tobytes()
+    
+    stream = generate()
+    next(stream)
+    return stream
+
+# gTTS endpoint host; a request here during startup leaves a warm TLS connection in the pool
+_GTTS_WARMUP_URL = "https://translate.google.com/"
+
+# Text parts of one utterance fetched in parallel (within the pooled session's 8 connections)
+_GTTS_MAX_CONCURRENT_PARTS = 4
+
+# Marker of the audio payload line in Google Translate's batchexecute response.
+# Mirrors gTTS's own parsing (requirements.txt pins the gtts version this was copied from).
+_GTTS_AUDIO_RE = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+class _GTTSFormatChanged(Exception):
+    """The installed gTTS or Google's response no longer matches what PooledGTTS expects"""
+
+class PooledGTTS(gTTS):
+    """
+    gTTS that sends its requests over a shared keep-alive session instead of a new one per call
+    
+    Relies on gTTS internals (_prepare_requests and the batchexecute response format);
+    if either changes, it falls back to plain gTTS.stream().
+    """
+    
+    def __init__(self, *args, session: requests.Session, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = session
+    
+    def stream(self):
+        """Yield the mp3 bytes of each text part (same protocol as gTTS.stream)"""
+        prepare_requests = getattr(self, "_prepare_requests", None)
+        if prepare_requests is None:
+            logger.warning("⚠️  gTTS internals changed, using unpooled gTTS requests")
+            yield from super().stream()
+            return
+        
+        prepared_requests = prepare_requests()
+        yielded = False
+        try:
+            if len(prepared_requests) == 1:
+                yield self._fetch_part(prepared_requests[0])
+                return
+            
+            # gTTS splits long text into ~100 character parts; fetch them concurrently, yield in order.
+            # MP3 frames are self-contained, so the parts simply concatenate.
+            with ThreadPoolExecutor(max_workers=min(len(prepared_requests), _GTTS_MAX_CONCURRENT_PARTS)) as executor:
+                for part in executor.map(self._fetch_part, prepared_requests):
+                    yielded = True
+                    yield part
+        except _GTTSFormatChanged:
+            # A format change hits the first part, so normally nothing was yielded yet
+            if yielded:
+                raise gTTSError(tts=self)
+            logger.warning("⚠️  gTTS response format changed, using unpooled gTTS requests")
+            yield from super().stream()
+    
+    def _fetch_part(self, prepared: requests.PreparedRequest) -> bytes:
+        """Send one prepared gTTS request and return its decoded mp3 bytes"""
+        try:
+            response = self._http.send(prepared, proxies=urllib.request.getproxies())
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            raise gTTSError(tts=self, response=response) from e
+        except requests.exceptions.RequestException as e:
+            raise gTTSError(tts=self) from e
+        
+        audio = []
+        for line in response.iter_lines(chunk_size=1024):
+            decoded_line = line.decode("utf-8")
+            if "jQ1olc" in decoded_line:
+                audio_search = _GTTS_AUDIO_RE.search(decoded_line)
+                if audio_search is None:
+                    raise _GTTSFormatChanged()
+                audio.append(base64.b64decode(audio_search.group(1).encode("ascii")))
+        if not audio:
+            raise _GTTSFormatChanged()
+        return b"".join(audio)
 
 class TTSModule:
-    def __init__(self, voice_lang: str = "en", voice_slow: bool = False, stt_module=None):
+    def __init__(self, voice_lang: str = "en", voice_slow: bool = False, stt_module=None,
+                 first_chunk_max_chars: Optional[int] = 60, voice_backend: Optional[str] = None,
+                 piper_model: Optional[str] = None):
         """
-        Initialize TTS module using Google TTS
+        Initialize TTS module using Google TTS or Piper
         
         Args:
             voice_lang: Language code (e.g., "en", "en-us", "en-gb")
             voice_slow: Whether to speak slowly
             stt_module: Optional STT module to pause during speech
+            first_chunk_max_chars: Cut a longer first sentence at a clause boundary
+                so the first audio arrives sooner (None to disable)
+            voice_backend: "gtts" (network) or "piper" (local ONNX voice); defaults
+                to $MAX_TTS_BACKEND, then "gtts"
+            piper_model: Path to the Piper .onnx voice; defaults to $PIPER_MODEL
         """
         self.voice_lang = voice_lang
         self.voice_slow = voice_slow
+        self.first_chunk_max_chars = first_chunk_max_chars
+        self.voice_backend = (voice_backend or os.getenv("MAX_TTS_BACKEND") or "gtts").lower()
+        self._piper_voice = None
+        if self.voice_backend == "piper":
+            if PiperVoice is None:
+                raise ImportError("voice_backend='piper' requires piper-tts (pip install piper-tts)")
+            piper_model = piper_model or os.getenv("PIPER_MODEL")
+            if not piper_model:
+                raise ValueError("voice_backend='piper' needs a voice model (piper_model or $PIPER_MODEL)")
+            # Loads the ONNX Runtime session once; every utterance reuses it
+            self._piper_voice = PiperVoice.load(piper_model)
+        elif self.voice_backend != "gtts":
+            raise ValueError(f"Unknown voice_backend '{self.voice_backend}' (expected 'gtts' or 'piper')")
         self.is_speaking = False
-        self.current_speech_process = None  # Track current speech process
-        self.temp_dir = tempfile.mkdtemp()
+        self.current_device = None  # Track the active playback device for interruption
+        # One pooled keep-alive session to Google, so only the first utterance pays for DNS/TCP/TLS
+        self._http = requests.Session()
+        self._http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        self._http.headers.update({"Connection": "keep-alive"})
+        self.cache_dir = TTS_CACHE_DIR
+        self._seq = itertools.count()  # Unique suffix for in-progress cache writes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        atexit.register(self.cleanup)  # Trim the cache even if cleanup() is never called
         self.stt_module = stt_module  # Reference to STT module for pausing
         self.interruption_callback = None  # Callback for interruption events
-        self.speech_thread = None  # Track the speech thread
+        self._speech_queue = queue.Queue()  # Pending non-blocking utterances (FIFO)
+        self.speech_thread = threading.Thread(target=self._speech_worker_loop, name="max-tts-worker", daemon=True)
+        self.speech_thread.start()
         self.os_type = platform.system().lower()
         
+        # Resolve DNS and finish the TLS handshake while the other modules load
+        if self.voice_backend == "gtts":
+            threading.Thread(target=self._prewarm_connection, daemon=True).start()
+        
         print(f"✅ TTS initialized successfully!")
+        print(f"🗣️  Backend: {self.voice_backend}")
         print(f"🎤 Language: {voice_lang}")
         print(f"🐌 Slow speech: {voice_slow}")
     
+    def _prewarm_connection(self):
+        """Open the pooled connection to Google so the first utterance skips DNS/TCP/TLS setup"""
+        try:
+            self._http.head(_GTTS_WARMUP_URL, timeout=2)
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"TTS connection prewarm failed: {e}")
+    
     def set_interruption_callback(self, callback: Callable[[], None]):
         """Set callback for interruption events"""
         self.interruption_callback = callback
@@ -50,23 +355,60 @@ class TTSModule:
             text: Text to speak
             blocking: If True, wait for speech to complete
         """
-        if not text.strip():
+        text = text.strip()
+        # Nothing worth synthesizing (empty or a stray character)
+        if len(text) < 2:
             return
         
-        print("🎤 TTS: Converting text to speech...")
-        
         if blocking:
             # Speak synchronously
             self._speak_sync(text)
         else:
-            # Speak asynchronously
-            self.speech_thread = threading.Thread(target=self._speak_sync, args=(text,))
-            self.speech_thread.daemon = True
-            self.speech_thread.start()
-    
-    def _speak_sync(self, text: str):
-        """Synchronous speech synthesis"""
-        temp_file = None
+            # Speak asynchronously on the persistent worker
+            self._speech_queue.put((text, None))
+    
+    def speak_stream(self, chunks: Iterable[str], on_done: Optional[Callable[[], None]] = None):
+        """
+        Speak text that is still being generated (e.g. streamed LLM tokens)
+        
+        Sentences are synthesized as soon as they are complete, so playback can
+        start before the full text exists. Queued like a non-blocking speak().
+        
+        Args:
+            chunks: Iterable of text fragments, consumed on the speech worker
+            on_done: Called once the stream has been spoken, interrupted or dropped
+        """
+        self._speech_queue.put((chunks, on_done))
+    
+    def _speech_worker_loop(self):
+        """Speak queued utterances one at a time, in the order they were queued"""
+        while True:
+            text, on_done = self._speech_queue.get()
+            try:
+                self._speak_sync(text)
+            finally:
+                if on_done:
+                    on_done()
+    
+    def _clear_pending_speech(self):
+        """Drop utterances that are queued but not yet spoken"""
+        while True:
+            try:
+                text, on_done = self._speech_queue.get_nowait()
+            except queue.Empty:
+                break
+            # Release a dropped stream (e.g. its HTTP response) and report it as finished
+            close = getattr(text, "close", None)
+            if close:
+                close()
+            if on_done:
+                on_done()
+    
+    def _speak_sync(self, text):
+        """Synchronous speech synthesis, pipelined sentence by sentence (text may be a chunk iterable)"""
+        sentences = _iter_sentences(text, self.first_chunk_max_chars)
+        audio_queue = queue.Queue(maxsize=_AUDIO_QUEUE_SIZE)
+        stop_event = threading.Event()
         try:
             # Set speaking flag
             self.is_speaking = True
@@ -75,91 +417,199 @@ class TTSModule:
             if self.stt_module:
                 self.stt_module.pause_listening()
             
-            # Create TTS object
-            print("🌐 TTS: Converting text to speech...")
-            tts = gTTS(text=text, lang=self.voice_lang, slow=self.voice_slow)
-            
-            # Generate temporary file with unique name
-            temp_file = os.path.join(self.temp_dir, f"speech_{int(time.time() * 1000)}.mp3")
-            tts.save(temp_file)
-            
-            # Play the audio with process tracking for interruption
-            self._play_audio_with_interruption(temp_file)
+            # Synthesize sentence N+1 while sentence N is playing
+            logger.info("🌐 TTS: Converting text to speech...")
+            producer = threading.Thread(
+                target=self._synthesize_sentences,
+                args=(sentences, text, audio_queue, stop_event),
+                daemon=True
+            )
+            producer.start()
             
-            # Resume STT listening after speech
-            if self.stt_module:
-                self.stt_module.resume_listening()
+            while self.is_speaking:
+                audio = audio_queue.get()
+                if audio is None:
+                    break
+                # Play the audio with process tracking for interruption
+                self._play_audio_with_interruption(audio)
                 
         except Exception as e:
-            print(f"❌ TTS error: {e}")
+            logger.error(f"❌ TTS error: {e}")
         finally:
-            # Always clean up the temporary file
-            if temp_file and os.path.exists(temp_file):
-                try:
-                    os.remove(temp_file)
-                except:
-                    pass
+            # Stop the producer and drop anything it already synthesized
+            stop_event.set()
+            self._drain_audio_queue(audio_queue)
             # Make sure to resume STT even if there's an error
             if self.stt_module:
                 self.stt_module.resume_listening()
             # Always reset speaking flag
             self.is_speaking = False
     
-    def _play_audio_with_interruption(self, audio_file: str):
-        """Play audio with interruption capability using subprocess"""
+    def _synthesize_sentences(self, sentences: Iterable[str], source, audio_queue: queue.Queue, stop_event: threading.Event):
+        """Producer side of the speech pipeline: synthesize and decode each sentence to ready-to-play PCM"""
+        try:
+            for sentence in sentences:
+                if stop_event.is_set() or not self.is_speaking:
+                    break
+                
+                sentence = self._clean_for_speech(sentence)
+                if len(sentence) < 2:
+                    continue
+                
+                # Decoding here overlaps it with playback of the previous sentence
+                audio = self._decode_for_playback(self._synthesize(sentence))
+                
+                # Speech was interrupted while we were synthesizing or waiting for room
+                if not self._put_audio(audio_queue, audio, stop_event):
+                    break
+        except Exception as e:
+            logger.error(f"❌ TTS error: {e}")
+        finally:
+            # Stop pulling from a streamed source we no longer need
+            for stream in (sentences, source):
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+            if stop_event.is_set():
+                # Nobody will play what is still queued
+                self._drain_audio_queue(audio_queue)
+            else:
+                # Sentinel: no more audio for this utterance
+                self._put_audio(audio_queue, None, stop_event)
+    
+    def _put_audio(self, audio_queue: queue.Queue, audio, stop_event: threading.Event) -> bool:
+        """Queue audio for playback once there is room; False if speech stopped first"""
+        while not stop_event.is_set():
+            try:
+                audio_queue.put(audio, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def _drain_audio_queue(self, audio_queue: queue.Queue):
+        """Discard queued audio (also unblocks a producer waiting for room)"""
+        while True:
+            try:
+                audio_queue.get_nowait()
+            except queue.Empty:
+                break
+    
+    def _synthesize(self, text: str) -> Union[str, bytes]:
+        """Synthesize text with the configured backend (cached mp3 path or fresh mp3 bytes for gTTS, WAV bytes for Piper)"""
+        if self._piper_voice is not None:
+            return self._synthesize_piper(text)
+        return self._get_or_synthesize(text)
+    
+    def _synthesize_piper(self, text: str) -> bytes:
+        """Synthesize text locally with Piper into in-memory WAV bytes (no network, no temp file)"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            # piper-tts >= 1.3 renamed the WAV writer to synthesize_wav
+            synthesize_wav = getattr(self._piper_voice, "synthesize_wav", self._piper_voice.synthesize)
+            synthesize_wav(text, wav_file)
+        return buffer.getvalue()
+    
+    def _get_or_synthesize(self, text: str) -> Union[str, bytes]:
+        """Return the cached gTTS mp3 path for text, or on a miss the freshly synthesized mp3 bytes"""
+        # gTTS output is deterministic for (text, lang, slow), so identical requests share one file
+        key = hashlib.blake2b(f"{text}|{self.voice_lang}|{self.voice_slow}".encode("utf-8"), digest_size=16).hexdigest()
+        path = os.path.join(self.cache_dir, f"{key}.mp3")
+        
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # Mark as recently used for cleanup()
+            except OSError:
+                pass
+            return path
+        
+        # Create TTS object and synthesize into memory; playback decodes these bytes directly
+        tts = PooledGTTS(text=text, lang=self.voice_lang, slow=self.voice_slow, session=self._http)
+        buffer = io.BytesIO()
+        tts.write_to_fp(buffer)
+        mp3_bytes = buffer.getvalue()
+        
+        self._store_in_cache(path, mp3_bytes)
+        return mp3_bytes
+    
+    def _store_in_cache(self, path: str, mp3_bytes: bytes):
+        """Persist an mp3 for later runs; a failure only costs a future cache miss"""
+        # Write under a unique name, then rename, so a concurrent reader never sees a partial mp3
+        # (pid + counter is unique across processes and threads; next() on a count is atomic under the GIL)
+        partial_file = f"{path}.{os.getpid()}.{next(self._seq)}.part"
         try:
-            # Use system audio player that can be interrupted
-            if self.os_type == "darwin":  # macOS
-                cmd = ["afplay", audio_file]
-            elif self.os_type == "linux":
-                cmd = ["aplay", audio_file]
-            else:  # Windows
-                cmd = ["start", "/min", "cmd", "/c", f'"{audio_file}"']
+            with open(partial_file, 'wb') as f:
+                f.write(mp3_bytes)
+            os.replace(partial_file, path)
+        except OSError as e:
+            logger.warning(f"⚠️  Could not cache TTS audio: {e}")
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+    
+    def _decode_for_playback(self, audio: Union[str, bytes]) -> np.ndarray:
+        """Decode synthesized audio to playback-format int16 PCM with the surrounding silence trimmed"""
+        # Paths are decoded from disk, encoded bytes (e.g. Piper's WAV) from memory;
+        # miniaudio's C decoder runs without the GIL, so STT keeps running meanwhile
+        decode = miniaudio.decode_file if isinstance(audio, str) else miniaudio.decode
+        decoded = decode(
+            audio,
+            output_format=miniaudio.SampleFormat.SIGNED16,
+            nchannels=_PLAYBACK_CHANNELS,
+            sample_rate=_PLAYBACK_SAMPLE_RATE
+        )
+        
+        # Trim the dead air gTTS leaves around each sentence so consecutive sentences flow
+        pcm = np.frombuffer(decoded.samples, dtype=np.int16)
+        start, end = _trim_silence_bounds(pcm, _SILENCE_THRESHOLD)
+        return pcm[max(0, start - _SILENCE_PAD_SAMPLES):min(len(pcm), end + _SILENCE_PAD_SAMPLES)]
+    
+    def _play_audio_with_interruption(self, audio: Union[np.ndarray, str, bytes]):
+        """Play audio in-process with miniaudio so it can be stopped instantly (decoding it first unless it is PCM)"""
+        finished = threading.Event()
+        device = None
+        try:
+            logger.info("🔊 TTS: Playing audio...")
+            pcm = audio if isinstance(audio, np.ndarray) else self._decode_for_playback(audio)
+            stream = miniaudio.stream_with_callbacks(_pcm_stream(pcm), end_callback=finished.set)
+            next(stream)  # Prime the generator before handing it to the device
             
-            # Start the audio process
-            print("🔊 TTS: Playing audio...")
-            self.current_speech_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
+            device = miniaudio.PlaybackDevice(
+                output_format=miniaudio.SampleFormat.SIGNED16,
+                nchannels=_PLAYBACK_CHANNELS,
+                sample_rate=_PLAYBACK_SAMPLE_RATE,
+                buffersize_msec=_PLAYBACK_BUFFER_MSEC
             )
+            self.current_device = device
+            device.start(stream)
             
-            # Wait for the process to complete (unless interrupted)
-            while self.current_speech_process.poll() is None and self.is_speaking:
-                time.sleep(0.1)
-            
-            # If we're no longer speaking, kill the process
-            if not self.is_speaking and self.current_speech_process.poll() is None:
-                self.current_speech_process.terminate()
-                try:
-                    self.current_speech_process.wait(timeout=1)
-                except subprocess.TimeoutExpired:
-                    self.current_speech_process.kill()
+            # Wait for playback to complete (unless interrupted)
+            while self.is_speaking and not finished.wait(0.05):
+                pass
+            if self.is_speaking:
+                # Let the last buffered samples reach the speakers
+                time.sleep(_PLAYBACK_BUFFER_MSEC / 1000)
             
         except Exception as e:
-            print(f"Error playing audio: {e}")
-            # Fallback to playsound if subprocess fails
-            try:
-                from playsound import playsound
-                playsound(audio_file)
-            except Exception as fallback_error:
-                print(f"Fallback audio also failed: {fallback_error}")
+            logger.error(f"Error playing audio: {e}")
+        finally:
+            self.current_device = None
+            if device is not None:
+                device.close()
     
     def stop_speaking(self):
         """Stop current speech"""
+        self._clear_pending_speech()
         if self.is_speaking:
             self.is_speaking = False
-            print("🛑 SPEECH STOPPED!")
+            logger.info("🛑 SPEECH STOPPED!")
             
-            # Kill the current speech process if it exists
-            if self.current_speech_process and self.current_speech_process.poll() is None:
+            # Stop the playback device immediately
+            device = self.current_device
+            if device is not None:
                 try:
-                    self.current_speech_process.terminate()
-                    self.current_speech_process.wait(timeout=1)
-                except subprocess.TimeoutExpired:
-                    self.current_speech_process.kill()
+                    device.stop()
                 except Exception as e:
-                    print(f"Error stopping speech process: {e}")
+                    logger.error(f"Error stopping playback: {e}")
             
             # Resume STT listening immediately
             if self.stt_module:
@@ -168,7 +618,7 @@ class TTSModule:
     def interrupt_speech(self):
         """Interrupt current speech"""
         if self.is_speaking:
-            print("🚨 SPEECH INTERRUPTED!")
+            logger.info("🚨 SPEECH INTERRUPTED!")
             self.stop_speaking()
             
             # Call interruption callback if set
@@ -185,48 +635,49 @@ class TTSModule:
         if not response.strip():
             return
         
-        # Clean up response for speech
-        clean_response = response.strip()
+        clean_response = self._clean_for_speech(response)
+        if len(clean_response) < 2:
+            return
         
-        # Remove any thinking tokens or extra formatting
-        if clean_response.startswith("🤖 Max"):
-            # Extract just the response part
-            parts = clean_response.split(":", 1)
-            if len(parts) > 1:
-                clean_response = parts[1].strip()
+        logger.info(f"🗣️  Max speaking: {clean_response}")
+        self.speak(clean_response, blocking=False)
+    
+    def _clean_for_speech(self, text: str) -> str:
+        """Strip the "🤖 Max:" display prefix and emojis so only speakable text remains"""
+        # Remove any thinking tokens or extra formatting, keeping just the response part
+        clean_text = _PREFIX_RE.sub('', text.strip(), count=1)
         
         # Remove emojis from the response
-        clean_response = self._remove_emojis(clean_response)
-        
-        print(f"🗣️  Max speaking: {clean_response}")
-        self.speak(clean_response, blocking=False)
+        return self._remove_emojis(clean_text)
     
     def _remove_emojis(self, text: str) -> str:
         """Remove emojis from text"""
-        import re
-        # Remove emoji characters (Unicode emoji ranges)
-        emoji_pattern = re.compile(
-            "["
-            "\U0001F600-\U0001F64F"  # emoticons
-            "\U0001F300-\U0001F5FF"  # symbols & pictographs
-            "\U0001F680-\U0001F6FF"  # transport & map symbols
-            "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-            "\U00002702-\U000027B0"  # dingbats
-            "\U000024C2-\U0001F251"  # enclosed characters
-            "]+", flags=re.UNICODE
-        )
-        return emoji_pattern.sub('', text).strip()
+        return _EMOJI_RE.sub('', text).strip()
     
     def is_available(self) -> bool:
         """Check if TTS is available"""
-        return True  # gTTS is always available if installed
+        return True  # gTTS is always available if installed; Piper fails fast in __init__
     
     def cleanup(self):
-        """Clean up temporary files and directories"""
+        """Trim the mp3 cache to its TTS_CACHE_MAX_FILES most recently used entries"""
         try:
-            import shutil
-            if os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
+            with os.scandir(self.cache_dir) as scan:
+                entries = list(scan)
+            
+            # Partial writes orphaned by a crashed or killed process; recent ones may still be in progress
+            stale_before = time.time() - _STALE_PARTIAL_SECONDS
+            for entry in entries:
+                if entry.name.endswith(".part"):
+                    try:
+                        if entry.stat().st_mtime < stale_before:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+            
+            cached = [entry for entry in entries if entry.name.endswith(".mp3")]
+            cached.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+            for entry in cached[TTS_CACHE_MAX_FILES:]:
+                os.remove(entry.path)
         except:
             pass
     
@@ -242,10 +693,18 @@ class TTSModule:
             "Your calendar shows a meeting at 2 PM."
         ]
         
-        for i, phrase in enumerate(test_phrases, 1):
-            print(f"\n{i}. Speaking: {phrase}")
-            self.speak(phrase, blocking=True)
-            time.sleep(0.5)
+        # Synthesize all phrases up front so network latency overlaps playback
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self._synthesize, phrase) for phrase in test_phrases]
+            
+            for i, (phrase, future) in enumerate(zip(test_phrases, futures), 1):
+                print(f"\n{i}. Speaking: {phrase}")
+                audio = future.result()
+                self.is_speaking = True
+                try:
+                    self._play_audio_with_interruption(audio)
+                finally:
+                    self.is_speaking = False
         
         print("\n✅ TTS test completed!")
 
@@ -255,4 +714,5 @@ def test_tts():
     tts.test_voice()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     test_tts()